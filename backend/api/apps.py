@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+
+        from foodgram.db import check_connections_health
+        from . import signals  # noqa: F401
+
+        if (settings.DB_CONN_HEALTH_CHECKS
+                and not settings.DB_POOL
+                and settings.DATABASES['default'].get('CONN_MAX_AGE')):
+            request_started.connect(check_connections_health)
@@ -0,0 +1,127 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Локальный для процесса LRU-кеш токенов с ограниченным временем жизни.
+    Хранит пары (пользователь, токен) по ключу токена.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, (user, _)) in self._data.items()
+                        if user.pk == user_id]:
+                del self._data[key]
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def count_token_cache(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_token_cache_stats():
+    """Статистика кеша токенов текущего процесса."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = sum(stats.values())
+    stats['hit_rate'] = (
+        round((stats['local_hits'] + stats['shared_hits']) / total, 4)
+        if total else None)
+    return stats
+
+
+def get_shared_cache_key(key):
+    # Сам токен в ключах общего кеша не хранится.
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    token_cache.delete(key)
+    if settings.TOKEN_SHARED_CACHE:
+        cache.delete(get_shared_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    token_cache.delete_user(user_id)
+    if settings.TOKEN_SHARED_CACHE:
+        cache.delete_many([
+            get_shared_cache_key(key) for key in Token.objects.filter(
+                user_id=user_id).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кешированием пользователя.
+    Сначала проверяется локальный кеш процесса, затем (если включен)
+    общий кеш, и только потом БД. Локальный кеш других процессов
+    при выходе или смене пароля не сбрасывается, поэтому время его жизни
+    TOKEN_CACHE_TTL должно быть небольшим.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            count_token_cache('local_hits')
+        elif settings.TOKEN_SHARED_CACHE:
+            cached = cache.get(get_shared_cache_key(key))
+            if cached is not None:
+                count_token_cache('shared_hits')
+                token_cache.set(key, cached)
+        if cached is None:
+            count_token_cache('misses')
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+            if settings.TOKEN_SHARED_CACHE:
+                cache.set(
+                    get_shared_cache_key(key), cached,
+                    settings.TOKEN_SHARED_CACHE_TTL)
+        user, token = cached
+        # Каждый запрос получает свою копию пользователя,
+        # чтобы изменения в одном запросе не попадали в кеш.
+        return copy.copy(user), token
@@ -1,11 +1,37 @@
+from django import forms
 from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django_filters.fields import MultipleChoiceField
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+
+from .utils import get_tag_ids
 
 
 User = get_user_model()
 
+INGREDIENTS_MODE_ALL = 'all'
+INGREDIENTS_MODE_ANY = 'any'
+
+
+class SlugMultipleChoiceField(MultipleChoiceField):
+    """Список slug без проверки по choices."""
+
+    def valid_value(self, value):
+        return True
+
+
+class SlugMultipleFilter(filters.MultipleChoiceFilter):
+    """Фильтр по нескольким slug: ?tags=breakfast&tags=lunch."""
+    field_class = SlugMultipleChoiceField
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Фильтр по списку целых чисел через запятую: ?ingredients=1,2,3."""
+    field_class = forms.IntegerField
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='startswith')
@@ -17,12 +43,20 @@ class IngredientFilter(FilterSet):
 
 class RecipeFilter(FilterSet):
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    tags = SlugMultipleFilter(method='filter_tags')
 
+    ingredients = IntegerInFilter(method='filter_ingredients')
+    ingredients_mode = filters.ChoiceFilter(
+        choices=((INGREDIENTS_MODE_ALL, 'Все ингредиенты'),
+                 (INGREDIENTS_MODE_ANY, 'Любой из ингредиентов')),
+        method='filter_ingredients_mode')
+    exclude_ingredients = IntegerInFilter(
+        method='filter_exclude_ingredients')
+    cooking_time__lte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte')
+    cooking_time__gte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte')
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
@@ -31,14 +65,63 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_tags(self, queryset, name, value):
+        # Полусоединение по промежуточной таблице вместо JOIN с тегами:
+        # рецепт с несколькими подходящими тегами не дублируется.
+        tag_ids = get_tag_ids(value)
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(id__in=Recipe.tags.through.objects.filter(
+            tag_id__in=tag_ids).values('recipe_id'))
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = set(value)
+        if not ingredient_ids:
+            return queryset
+        recipes = IngredientInRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids).values('recipe')
+        mode = self.form.cleaned_data.get('ingredients_mode')
+        if mode != INGREDIENTS_MODE_ANY:
+            # GROUP BY recipe HAVING COUNT(DISTINCT ingredient) = n.
+            recipes = recipes.annotate(
+                matched=Count('ingredient', distinct=True)
+            ).filter(matched=len(ingredient_ids)).values('recipe')
+        return queryset.filter(id__in=recipes)
+
+    def filter_ingredients_mode(self, queryset, name, value):
+        # Режим учитывается в filter_ingredients.
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.exclude(id__in=IngredientInRecipe.objects.filter(
+            ingredient_id__in=set(value)).values('recipe'))
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if value:
+            return queryset.search(value)
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value and not user.is_anonymous:
-            return queryset.filter(favoriterecipe__user=user)
+        if value and not self.request.user.is_anonymous:
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(shoppingcart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
 
         return queryset
+
+
+class StableOrderingFilter(OrderingFilter):
+    """Сортировка с добавлением id, чтобы порядок страниц был стабильным."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            descending = ordering[0].startswith('-')
+            ordering = [*ordering, '-id' if descending else 'id']
+        return ordering
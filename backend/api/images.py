@@ -0,0 +1,177 @@
+import base64
+import binascii
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile)
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from recipes.constans import IMAGE_RENDITIONS, RECIPES_VERSION
+from recipes.models import DataVersion
+
+
+logger = logging.getLogger(__name__)
+
+# Размер части base64-строки, декодируемой за один раз (кратен 4).
+BASE64_CHUNK_SIZE = 64 * 1024
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images')
+
+
+def decode_base64_image(data):
+    """
+    Декодирует изображение из data URL по частям.
+    Небольшие файлы собираются в памяти, крупные - во временном файле
+    на диске, как это делают обработчики загрузки файлов Django.
+    Размер файла и число пикселей проверяются до полной загрузки
+    изображения в Pillow.
+    """
+    header_end = data.find(';base64,')
+    if header_end == -1:
+        raise serializers.ValidationError('Некорректное изображение.')
+    content_type = data[len('data:'):header_end]
+    name = 'temp.' + content_type.split('/')[-1]
+    start = header_end + len(';base64,')
+    # Переводы строк допустимы в base64 (перенос по 76 символов).
+    size = (len(data) - start - data.count('\n', start)
+            - data.count('\r', start)) * 3 // 4
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения не должен превышать '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE} байт.')
+
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+    else:
+        file = InMemoryUploadedFile(
+            BytesIO(), None, name, content_type, 0, None)
+    tail = ''
+    try:
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            # Пробельные символы удаляются, неполная группа из 4 символов
+            # переносится в следующую часть.
+            chunk = tail + ''.join(
+                data[position:position + BASE64_CHUNK_SIZE].split())
+            end = len(chunk) - len(chunk) % 4
+            file.write(base64.b64decode(chunk[:end], validate=True))
+            tail = chunk[end:]
+        if tail:
+            raise ValueError
+    except (binascii.Error, ValueError):
+        file.close()
+        raise serializers.ValidationError('Некорректное изображение.')
+    file.size = file.tell()
+    file.seek(0)
+
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except Exception:
+        # Ошибку формата сообщит стандартная проверка ImageField.
+        width = height = 0
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        file.close()
+        raise serializers.ValidationError(
+            'Изображение не должно содержать больше '
+            f'{settings.IMAGE_UPLOAD_MAX_PIXELS} пикселей.')
+    file.seek(0)
+    return file
+
+
+def get_rendition_name(name, rendition):
+    # Имя файла берется целиком, с расширением: файлы temp.png
+    # и temp.jpeg разных рецептов не должны давать одну копию.
+    directory, filename = posixpath.split(name)
+    return posixpath.join(
+        directory, 'renditions', f'{filename}_{rendition}.webp')
+
+
+def get_rendition_url(image, rendition):
+    """
+    Возвращает адрес уменьшенной копии или None, если ее еще нет.
+    Готовность копий хранится в поле <поле изображения>_renditions
+    модели: там записано имя изображения, для которого созданы копии.
+    """
+    ready = getattr(image.instance, f'{image.field.name}_renditions', None)
+    if ready != image.name:
+        return None
+    return image.storage.url(get_rendition_name(image.name, rendition))
+
+
+def delete_renditions(name):
+    """Удаляет уменьшенные копии изображения."""
+    try:
+        for rendition in IMAGE_RENDITIONS:
+            default_storage.delete(get_rendition_name(name, rendition))
+    except Exception:
+        logger.exception('Не удалось удалить копии изображения %s', name)
+
+
+def create_renditions(name, renditions, model, field):
+    """
+    Создает уменьшенные копии изображения в формате WebP и отмечает
+    их готовность у объектов с этим изображением. Копии предыдущего
+    изображения этих объектов удаляются.
+    """
+    ready_field = f'{field}_renditions'
+    try:
+        with default_storage.open(name) as file:
+            with Image.open(file) as original:
+                original = ImageOps.exif_transpose(original)
+                if original.mode not in ('RGB', 'RGBA'):
+                    original = original.convert('RGBA')
+                for rendition in renditions:
+                    image = original.copy()
+                    image.thumbnail(
+                        IMAGE_RENDITIONS[rendition], Image.LANCZOS)
+                    content = BytesIO()
+                    image.save(content, 'WEBP', quality=80, method=4)
+                    rendition_name = get_rendition_name(name, rendition)
+                    default_storage.delete(rendition_name)
+                    default_storage.save(
+                        rendition_name, ContentFile(content.getvalue()))
+        # Если изображение успели заменить, объект не найдется
+        # и копии не будут отмечены готовыми.
+        objects = model._default_manager.filter(**{field: name})
+        previous = set(objects.values_list(ready_field, flat=True))
+        objects.update(**{ready_field: name})
+        for previous_name in previous - {'', name}:
+            delete_renditions(previous_name)
+        # Адреса изображений входят в ответы о рецептах (в том числе
+        # аватары авторов), поэтому закешированные ответы устаревают.
+        DataVersion.objects.bump(RECIPES_VERSION)
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+    finally:
+        # Соединение с БД фонового потока закрывается после задачи.
+        connections.close_all()
+
+
+def schedule_renditions(image, renditions):
+    """
+    Ставит создание уменьшенных копий в очередь фоновых потоков
+    после фиксации текущей транзакции.
+    """
+    if not image:
+        return
+    name = image.name
+    model = type(image.instance)
+    field = image.field.name
+    transaction.on_commit(lambda: executor.submit(
+        create_renditions, name, renditions, model, field))
+
+
+def schedule_renditions_deletion(name):
+    """Ставит удаление уменьшенных копий в очередь фоновых потоков."""
+    if not name:
+        return
+    transaction.on_commit(lambda: executor.submit(delete_renditions, name))
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .profiling import current_profile
+
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Показатели одного запроса: запросы к БД и время этапов."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = Counter()
+        self.sql = Counter()
+        self.view_start = None
+        self.view_end = None
+        self._active = set()
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.sql[sql] += 1
+
+    def get_duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.sql.most_common()
+                if count > threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка запросов к БД: учитывает запрос в показателях и в профиле
+    текущего запроса, если они ведутся.
+    """
+    recorders = [
+        recorder for recorder in (current_metrics.get(), current_profile.get())
+        if recorder is not None]
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for recorder in recorders:
+            recorder.record_query(sql, duration)
+
+
+@contextmanager
+def measure(name):
+    """
+    Добавляет время выполнения блока к показателю name текущего запроса.
+    Вложенные блоки с тем же именем не учитываются повторно.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or name in metrics._active:
+        yield
+        return
+    metrics._active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - start
+        metrics._active.discard(name)
+
+
+class TimedSerializerMixin:
+    """Учитывает время сериализации в показателях запроса."""
+
+    def to_representation(self, instance):
+        with measure('serializer'):
+            return super().to_representation(instance)
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus (накопительные корзины)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        total = 0
+        for bound, count in zip(
+                (*self.buckets, '+Inf'), self.counts):
+            total += count
+            lines.append(
+                f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+METRICS = (
+    ('foodgram_request_duration_seconds', 'Время обработки запроса.',
+     DURATION_BUCKETS),
+    ('foodgram_request_db_duration_seconds', 'Время запросов к БД.',
+     DURATION_BUCKETS),
+    ('foodgram_request_db_queries', 'Число запросов к БД.',
+     QUERY_COUNT_BUCKETS),
+)
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe_request(endpoint, method, duration, metrics):
+    """Добавляет показатели запроса в гистограммы эндпоинта."""
+    values = (duration, metrics.db_time, metrics.queries)
+    with _histograms_lock:
+        for (name, _, buckets), value in zip(METRICS, values):
+            key = (name, endpoint, method)
+            if key not in _histograms:
+                _histograms[key] = Histogram(buckets)
+            _histograms[key].observe(value)
+
+
+def render_prometheus():
+    """Гистограммы текущего процесса в текстовом формате Prometheus."""
+    lines = []
+    with _histograms_lock:
+        for name, description, _ in METRICS:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (key_name, endpoint, method), histogram in sorted(
+                    _histograms.items()):
+                if key_name == name:
+                    lines.extend(histogram.render(
+                        name, f'endpoint="{endpoint}",method="{method}"'))
+    return '\n'.join(lines) + '\n'
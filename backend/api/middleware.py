@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from recipes.constans import PROFILE_REASON_SAMPLE, PROFILE_REASON_STAFF
+from recipes.models import ProfileDump
+from .authentication import CachedTokenAuthentication
+from .metrics import RequestMetrics, current_metrics, observe_request
+from .profiling import RequestProfile, current_profile
+
+
+logger = logging.getLogger('foodgram.performance')
+
+
+class AsyncCapableMiddleware:
+    """
+    Основа middleware, работающего и в WSGI, и в ASGI без переключения
+    цепочки в синхронный режим (асинхронные представления остаются
+    асинхронными). Запросы к БД записываются оберткой, которая
+    устанавливается на каждое новое соединение (см. api.signals),
+    поэтому учитываются и запросы из потоков sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Замеряет число и время запросов к БД, время представления,
+    сериализации и отрисовки ответа. Результат передается в заголовке
+    Server-Timing, в журнале и в гистограммах эндпоинтов.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.finish(request, response, metrics, start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.finish(request, response, metrics, start)
+        return response
+
+    def finish(self, request, response, metrics, start):
+        total = time.perf_counter() - start
+        if metrics.view_start is not None:
+            view_end = metrics.view_end or start + total
+            metrics.timings['view'] = view_end - metrics.view_start
+            metrics.timings['render'] = start + total - view_end
+        self.report(request, response, metrics, total)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Ответы DRF отрисовываются после этого вызова.
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_end = time.perf_counter()
+        return response
+
+    def report(self, request, response, metrics, total):
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        timings = {
+            'db': metrics.db_time,
+            'serializer': metrics.timings.get('serializer', 0.0),
+            'view': metrics.timings.get('view', 0.0),
+            'render': metrics.timings.get('render', 0.0),
+            'total': total,
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            + (f';desc="{metrics.queries} queries"' if name == 'db' else '')
+            for name, duration in timings.items())
+        observe_request(endpoint, request.method, total, metrics)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'queries': metrics.queries,
+                **{f'{name}_ms': round(duration * 1000, 1)
+                   for name, duration in timings.items()},
+            }))
+        for sql, count in metrics.get_duplicates(
+                settings.DUPLICATE_QUERY_THRESHOLD):
+            logger.warning(json.dumps({
+                'message': 'duplicate query',
+                'endpoint': endpoint,
+                'path': request.path,
+                'count': count,
+                'sql': sql,
+            }, ensure_ascii=False))
+
+
+class ProfilerMiddleware(AsyncCapableMiddleware):
+    """
+    Профилирование запросов: по запросу сотрудника (заголовок
+    X-Profile: 1 или параметр ?profile=1) и для доли PROFILER_SAMPLE_RATE
+    обычных запросов. Стеки и запросы к БД сохраняются в ProfileDump
+    и доступны в админке.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        user = (self.get_staff_user(request)
+                if self.is_requested(request) else None)
+        reason = self.get_reason(user)
+        if reason is None:
+            return self.get_response(request)
+        profile = RequestProfile(settings.PROFILER_INTERVAL)
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+        self.save_dump(request, response, reason, user, profile)
+        return response
+
+    async def __acall__(self, request):
+        user = (await sync_to_async(self.get_staff_user)(request)
+                if self.is_requested(request) else None)
+        reason = self.get_reason(user)
+        if reason is None:
+            return await self.get_response(request)
+        profile = RequestProfile(settings.PROFILER_INTERVAL)
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+        await sync_to_async(self.save_dump)(
+            request, response, reason, user, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # В режиме ASGI синхронное представление выполняется в другом
+        # потоке, чем middleware: выборка стека переключается на него.
+        profile = current_profile.get()
+        if profile is not None:
+            profile.sampler.thread_id = threading.get_ident()
+
+    def is_requested(self, request):
+        return (request.GET.get('profile') == '1'
+                or request.headers.get('X-Profile') == '1')
+
+    def get_reason(self, user):
+        if user is not None:
+            return PROFILE_REASON_STAFF
+        if (settings.PROFILER_SAMPLE_RATE
+                and random.random() < settings.PROFILER_SAMPLE_RATE):
+            return PROFILE_REASON_SAMPLE
+        return None
+
+    def get_staff_user(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # Клиенты API передают токен, а не сессию.
+            try:
+                user, _ = (
+                    CachedTokenAuthentication().authenticate(request)
+                    or (None, None))
+            except AuthenticationFailed:
+                return None
+        if user is not None and user.is_staff:
+            return user
+        return None
+
+    def save_dump(self, request, response, reason, user, profile):
+        dump = ProfileDump.objects.create(
+            method=request.method,
+            path=request.get_full_path(),
+            user=user,
+            reason=reason,
+            status_code=response.status_code,
+            duration=profile.duration,
+            samples=profile.sampler.samples,
+            stacks=profile.sampler.folded(),
+            sql=profile.queries)
+        self.delete_old_dumps()
+        if reason == PROFILE_REASON_STAFF:
+            response['X-Profile-Id'] = dump.pk
+
+    def delete_old_dumps(self):
+        old = ProfileDump.objects.values_list('created_at', flat=True)[
+            settings.PROFILER_MAX_DUMPS:settings.PROFILER_MAX_DUMPS + 1]
+        if old:
+            ProfileDump.objects.filter(created_at__lte=old[0]).delete()
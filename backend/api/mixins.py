@@ -0,0 +1,138 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.response import Response
+
+from recipes.models import DataVersion
+
+
+RESPONSE_CACHE_HITS = 'response-cache-hits'
+RESPONSE_CACHE_MISSES = 'response-cache-misses'
+
+
+def count_response_cache(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_response_cache_stats():
+    stats = cache.get_many((RESPONSE_CACHE_HITS, RESPONSE_CACHE_MISSES))
+    return {
+        'hits': stats.get(RESPONSE_CACHE_HITS, 0),
+        'misses': stats.get(RESPONSE_CACHE_MISSES, 0),
+    }
+
+
+class DataVersionMixin:
+    """Получение версии данных data_versions один раз за запрос."""
+    data_versions = ()
+
+    def get_data_version(self):
+        if not hasattr(self, '_data_version'):
+            self._data_version = DataVersion.objects.get_versions(
+                *self.data_versions)
+        return self._data_version
+
+
+class ResponseCacheMixin(DataVersionMixin):
+    """
+    Серверный кеш ответов для анонимных пользователей.
+    Ключ строится по версии данных и нормализованным параметрам запроса,
+    поэтому при изменении данных старые ответы просто перестают читаться.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_response_cache_key(self, request, version):
+        params = urlencode(sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()), doseq=True)
+        key = '|'.join((
+            request.get_host(), self.action, version,
+            str(self.kwargs.get(self.lookup_field, '')), params))
+        return (f'response:{self.basename}:'
+                f'{hashlib.md5(key.encode()).hexdigest()}')
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        version, _ = self.get_data_version()
+        key = self.get_response_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            count_response_cache(RESPONSE_CACHE_HITS)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        count_response_cache(RESPONSE_CACHE_MISSES)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' in self.cached_actions:
+            return self.cached_response(
+                super().list, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' in self.cached_actions:
+            return self.cached_response(
+                super().retrieve, request, *args, **kwargs)
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ConditionalGetMixin(DataVersionMixin):
+    """
+    Поддержка условных GET-запросов для вьюсетов.
+    ETag и Last-Modified строятся по счетчикам версий data_versions,
+    при совпадении с заголовками запроса возвращается 304 Not Modified.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_etag(self, version):
+        return version
+
+    def get_cache_control(self):
+        return {'public': True, 'max_age': settings.HTTP_CACHE_MAX_AGE}
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        version, updated_at = self.get_data_version()
+        etag = self.get_etag(version)
+        if etag is None:
+            return view(request, *args, **kwargs)
+        etag = quote_etag(etag)
+        last_modified = (
+            int(updated_at.timestamp())
+            if updated_at and not request.user.is_authenticated else None)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.get_cache_control())
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' in self.conditional_actions:
+            return self.conditional_response(
+                super().list, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' in self.conditional_actions:
+            return self.conditional_response(
+                super().retrieve, request, *args, **kwargs)
+        return super().retrieve(request, *args, **kwargs)
@@ -1,5 +1,169 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet, FieldDoesNotExist, ValidationError)
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Пагинация по ключу (курсору) без OFFSET.
+    Курсор хранит значения полей ordering последнего объекта страницы,
+    следующая страница выбирается условием "после этих значений",
+    поэтому стоимость запроса не зависит от глубины прокрутки.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size and page_size.isdigit() and int(page_size) > 0:
+            return int(page_size)
+        return api_settings.PAGE_SIZE
+
+    def encode_cursor(self, instance):
+        values = [
+            str(getattr(instance, field.lstrip('-')))
+            for field in self.ordering]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(
+                    field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_filter(self, values):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(request, queryset)
+        if values is not None:
+            queryset = queryset.filter(self.get_cursor_filter(values))
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = (
+            self.encode_cursor(page[page_size - 1])
+            if len(page) > page_size else None)
+        return page[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор Django, кеширующий результат COUNT(*) на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд.
+    """
+
+    @cached_property
+    def count(self):
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        try:
+            sql = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            return super().count
+        if not timeout:
+            return super().count
+        key = f'count:{hashlib.md5(sql.encode()).hexdigest()}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout)
+        return count
 
 
 class CustomPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация с параметром limit.
+    При PAGINATION_CURSOR_MODE = True, параметре pagination=cursor
+    или наличии курсора в запросе используется пагинация по ключу.
+    Сортировка по аннотациям (например, релевантности поиска) всегда
+    идет постранично: их значения нельзя точно сохранить в курсоре.
+    """
     page_size_query_param = 'limit'
+    django_paginator_class = CachedCountPaginator
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            settings.PAGINATION_CURSOR_MODE
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPaginator.cursor_query_param in request.query_params)
+
+    def get_keyset_ordering(self, queryset):
+        """Поля для курсора или None, если сортировка не по полям модели."""
+        ordering = [
+            field for field in queryset.query.order_by
+            if isinstance(field, str)
+        ] or list(queryset.model._meta.ordering)
+        try:
+            for field in ordering:
+                if field.lstrip('-') != 'pk':
+                    queryset.model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            return None
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = (
+            self.get_keyset_ordering(queryset)
+            if self.use_cursor(request) else None)
+        if ordering is None:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPaginator()
+        self.keyset.ordering = ordering
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,72 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class StackSampler:
+    """
+    Выборочный профилировщик одного потока.
+    Фоновый поток с интервалом interval снимает стек профилируемого
+    потока и подсчитывает одинаковые стеки. Накладные расходы зависят
+    от интервала, а не от числа вызовов функций.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{frame.f_globals.get("__name__", "?")}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def folded(self):
+        """Стеки в свернутом формате: 'a;b;c число_выборок'."""
+        return '\n'.join(
+            f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Профиль одного запроса: стеки, запросы к БД и общее время."""
+
+    def __init__(self, interval):
+        self.queries = []
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.start = time.perf_counter()
+        self.duration = None
+        self.sampler.start()
+
+    def record_query(self, sql, duration):
+        self.queries.append(
+            {'sql': sql, 'time_ms': round(duration * 1000, 3)})
+
+    def stop(self):
+        self.sampler.stop()
+        self.duration = round((time.perf_counter() - self.start) * 1000, 3)
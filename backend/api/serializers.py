@@ -1,16 +1,21 @@
-import base64
 import re
 
-from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 from recipes.models import (
     Recipe, Tag, Ingredient, IngredientInRecipe,
-    FavoriteRecipe, Subscription, ShoppingCart, )
-from .utils import create_shortlink
+    FavoriteRecipe, Subscription, ShoppingCart, ShoppingListItem)
+from recipes.signals import batch_recipe_changes
+from .metrics import TimedSerializerMixin
+from .images import (
+    decode_base64_image, get_rendition_url, schedule_renditions)
+from .utils import create_shortlink, get_limit
 from recipes.validators import validate_cooking_time, validate_amount
 
 
@@ -18,13 +23,30 @@ User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
-    """Вспомогательный сериализатор для обработки изображения."""
+    """
+    Вспомогательный сериализатор для обработки изображения.
+    Если задан rendition, отдает адрес уменьшенной копии изображения,
+    а пока копия не готова - адрес оригинала.
+    """
+
+    def __init__(self, *args, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, value):
+        rendition = self.context.get('image_renditions', {}).get(
+            self.rendition, self.rendition)
+        if not value or rendition is None:
+            return super().to_representation(value)
+        url = get_rendition_url(value, rendition)
+        if url is None:
+            return super().to_representation(value)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
         return super().to_internal_value(data)
 
 
@@ -45,9 +67,11 @@ class SpecialUserCreateSerializer(UserCreateSerializer):
         return value
 
 
-class SpecialUserSerializer(UserSerializer):
+class SpecialUserSerializer(TimedSerializerMixin, UserSerializer):
     """Сериализатор для просмотра объекта пользователя."""
     is_subscribed = serializers.SerializerMethodField()
+    avatar = Base64ImageField(
+        rendition='avatar', required=False, allow_null=True)
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -57,6 +81,8 @@ class SpecialUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         current_user = self.context['request'].user
+        if hasattr(obj, 'is_subscribed'):
+            return current_user != obj and obj.is_subscribed
         return (
             current_user.is_authenticated and current_user != obj
             and obj.subscribers.filter(subscriber=current_user).exists())
@@ -69,6 +95,7 @@ class AvatarSerializer(serializers.Serializer):
     def save(self, instance, validated_data):
         instance.avatar = self.validated_data['avatar']
         instance.save()
+        schedule_renditions(instance.avatar, ('avatar',))
         return instance
 
 
@@ -86,7 +113,7 @@ class SetPasswordSerializer(serializers.Serializer):
         return instance
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор ингредиента."""
     class Meta:
         model = Ingredient
@@ -108,21 +135,94 @@ class IngredientInRecipeGetSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+DOES_NOT_EXIST = serializers.PrimaryKeyRelatedField.default_error_messages[
+    'does_not_exist']
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Список первичных ключей.
+    Объекты загружаются одним запросом id__in, в ошибке
+    перечисляются сразу все отсутствующие ключи.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                pks.append(pk_field.to_python(pk))
+            except (TypeError, ValueError, DjangoValidationError):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = child.get_queryset().in_bulk(set(pks))
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise ValidationError(
+                [DOES_NOT_EXIST.format(pk_value=pk) for pk in missing])
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, при many=True объекты загружаются одним запросом."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class IngredientInRecipeListSerializer(serializers.ListSerializer):
+    """
+    Список ингредиентов рецепта.
+    Все ингредиенты загружаются одним запросом id__in.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {item['id'] for item in items if 'id' in item})
+        errors = []
+        for item in items:
+            if 'id' not in item:
+                errors.append({'id': [
+                    self.child.fields['id'].error_messages['required']]})
+            elif item['id'] not in ingredients:
+                errors.append({'id': [
+                    DOES_NOT_EXIST.format(pk_value=item['id'])]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise ValidationError(errors)
+        for item in items:
+            item['id'] = ingredients[item['id']]
+        return items
+
+
 class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
     """
     Сериализатор количества ингредиента в рецепте.
     Сериализатор используется при создании и редактировании рецепта.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(validators=[validate_amount])
 
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
+        list_serializer_class = IngredientInRecipeListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор тега."""
 
     class Meta:
@@ -130,10 +230,10 @@ class TagSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериалиазатор чтения рецепта."""
     tags = TagSerializer(many=True)
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='detail')
     author = SpecialUserSerializer(read_only=True)
     ingredients = IngredientInRecipeGetSerializer(
         many=True, read_only=True, source='recipes')
@@ -148,6 +248,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'name', 'image', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         current_user = self.context['request'].user
         return (
             current_user.is_authenticated
@@ -155,6 +257,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                 recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         current_user = self.context['request'].user
         return (
             current_user.is_authenticated
@@ -164,7 +268,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор создания и изменения рецепта."""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all())
     image = Base64ImageField()
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -182,12 +286,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Нужно выбрать хотя бы один тэг.'
             )
-        tag_list = []
-        for tag_obj in value:
-            if tag_obj in tag_list:
-                raise serializers.ValidationError(
-                    'В рецепт нельзя добавлять одинаковые тэги')
-            tag_list.append(tag_obj)
+        if len({tag.id for tag in value}) != len(value):
+            raise serializers.ValidationError(
+                'В рецепт нельзя добавлять одинаковые тэги')
         return value
 
     def validate_ingredients(self, value):
@@ -195,12 +296,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Нужно выбрать хотя бы один ингредиент'
             )
-        ingredient_list = []
-        for ingr_obj in value:
-            if ingr_obj in ingredient_list:
-                raise serializers.ValidationError(
-                    'В рецепт нельзя добавлять одинаковые ингредиенты.')
-            ingredient_list.append(ingr_obj)
+        if len({item['id'].id for item in value}) != len(value):
+            raise serializers.ValidationError(
+                'В рецепт нельзя добавлять одинаковые ингредиенты.')
         return value
 
     def create_ingredients_for_recipe(self, recipe, ingredients):
@@ -212,37 +310,87 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 amount=ingredient['amount']))
         IngredientInRecipe.objects.bulk_create(ingredients_list)
 
+    def update_ingredients_for_recipe(self, recipe, ingredients):
+        """
+        Изменяет только отличающиеся строки ингредиентов рецепта.
+        Возвращает изменения количеств {id ингредиента: разница}
+        для добавленных и измененных строк; удаление строк меняет
+        списки покупок через сигналы.
+        """
+        current = {}
+        stale_ids = []
+        for row in recipe.recipes.all():
+            if row.ingredient_id in current:
+                stale_ids.append(row.pk)
+            else:
+                current[row.ingredient_id] = row
+        new_rows, changed_rows = [], []
+        amounts = {}
+        for ingredient in ingredients:
+            ingredient_id = ingredient['id'].id
+            row = current.pop(ingredient_id, None)
+            if row is None:
+                new_rows.append(IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']))
+                amounts[ingredient_id] = ingredient['amount']
+            elif row.amount != ingredient['amount']:
+                amounts[ingredient_id] = ingredient['amount'] - row.amount
+                row.amount = ingredient['amount']
+                changed_rows.append(row)
+        stale_ids.extend(row.pk for row in current.values())
+        if stale_ids:
+            IngredientInRecipe.objects.filter(pk__in=stale_ids).delete()
+        IngredientInRecipe.objects.bulk_create(new_rows)
+        IngredientInRecipe.objects.bulk_update(changed_rows, ['amount'])
+        return amounts
+
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        recipe.save()
-        self.create_ingredients_for_recipe(
-            recipe=recipe, ingredients=ingredients)
-        create_shortlink(recipe)
+        with transaction.atomic(), batch_recipe_changes():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients_for_recipe(
+                recipe=recipe, ingredients=ingredients)
+            create_shortlink(recipe)
+        schedule_renditions(recipe.image, ('thumbnail', 'detail'))
         return recipe
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        super(RecipeCreateSerializer, self).update(instance, validated_data)
-        instance.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.create_ingredients_for_recipe(
-            recipe=instance, ingredients=ingredients)
-        instance.save()
+        with transaction.atomic(), batch_recipe_changes():
+            if set(instance.tags.values_list('id', flat=True)) != {
+                    tag.id for tag in tags}:
+                instance.tags.set(tags)
+            amounts = self.update_ingredients_for_recipe(
+                instance, ingredients)
+            if amounts:
+                ShoppingListItem.objects.change_amounts(
+                    instance.shoppingcart_set.values_list(
+                        'user_id', flat=True),
+                    amounts)
+            super(RecipeCreateSerializer, self).update(
+                instance, validated_data)
+        if 'image' in validated_data:
+            schedule_renditions(instance.image, ('thumbnail', 'detail'))
         return instance
 
     def to_representation(self, instance):
+        # Повторная выборка с теми же prefetch и флагами, что и в списке.
+        user = self.context['request'].user
+        instance = Recipe.objects.with_related(user).with_user_flags(
+            user).get(pk=instance.pk)
         return RecipeGetSerializer(instance, context=self.context).data
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор краткого представления рецепта."""
     id = serializers.IntegerField()
     name = serializers.CharField()
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='thumbnail')
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -265,21 +413,19 @@ class SubscribeReturnSerializer(SpecialUserSerializer):
             'is_subscribed', 'recipes', 'recipes_count', 'avatar')
 
     def get_recipes(self, obj):
-        author_recipes = Recipe.objects.filter(author=obj)
-        request_recipes_limit = self.context.get('request').GET
-        recipes_limit = request_recipes_limit.get('recipes_limit')
-        try:
-            if recipes_limit is not None and isinstance(
-                    int(recipes_limit), int):
-                author_recipes = author_recipes[:int(recipes_limit)]
-        except ValueError:
-            raise serializers.ValidationError(
-                'Значение recipes_limit должно быть числом.')
+        if hasattr(obj, 'recipes_preview'):
+            author_recipes = obj.recipes_preview
+        else:
+            author_recipes = Recipe.objects.filter(author=obj)
+            recipes_limit = get_limit(
+                self.context['request'], 'recipes_limit')
+            if recipes_limit is not None:
+                author_recipes = author_recipes[:recipes_limit]
         return ShortRecipeSerializer(
             author_recipes, many=True, read_only=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
 
 
 class SubscribeCreateSerializer(serializers.ModelSerializer):
@@ -326,7 +472,9 @@ class ShoppingCartCreateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        return ShoppingCart.objects.create(**validated_data)
+        # Запись в списке и суммы ингредиентов меняются вместе.
+        with transaction.atomic():
+            return ShoppingCart.objects.create(**validated_data)
 
     def to_representation(self, instance):
         return ShortRecipeSerializer(
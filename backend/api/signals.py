@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import is_last_login_update
+from .authentication import invalidate_token, invalidate_user_tokens
+from .images import schedule_renditions_deletion
+from .metrics import record_query
+from .utils import forget_shortlink
+
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход через auth/token/logout удаляет токен пользователя.
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Смена пароля, деактивация и другие изменения пользователя.
+    if is_last_login_update(update_fields):
+        return
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    schedule_renditions_deletion(instance.image_renditions)
+    forget_shortlink(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def avatar_deleted(sender, instance, **kwargs):
+    schedule_renditions_deletion(instance.avatar_renditions)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Обертка ничего не делает вне замеряемого или профилируемого
+    # запроса; соединение может переподключаться, поэтому без повторов.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,430 @@
+import base64
+import os
+import re
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from recipes.models import (
+    Ingredient, IngredientInRecipe, ProfileDump, Recipe, ShoppingCart,
+    ShortLink, Tag)
+from .images import decode_base64_image
+from .serializers import Base64ImageField
+from .utils import encode_shortlink
+
+
+User = get_user_model()
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов к БД в списке рецептов не зависит от его размера."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password',
+            first_name='Имя', last_name='Фамилия')
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+            for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)]
+        for i in range(25):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=10)
+            recipe.tags.set(tags)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1)
+                for ingredient in ingredients)
+
+    def setUp(self):
+        # Кешированные ответы, COUNT(*) и токены не должны влиять на счет.
+        cache.clear()
+
+    def assert_list_queries(self, limit, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.url, {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        for limit in (2, 20):
+            with self.subTest(limit=limit):
+                cache.clear()
+                self.assert_list_queries(limit, 5)
+
+    def test_authenticated(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        # Токен попадает в локальный кеш процесса после первого запроса.
+        self.client.get(self.url)
+        for limit in (2, 20):
+            with self.subTest(limit=limit):
+                cache.clear()
+                self.assert_list_queries(limit, 5)
+
+
+class RecipeTagFilterTest(APITestCase):
+    """Фильтр по нескольким тегам не дублирует рецепты."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Имя', last_name='Фамилия')
+        breakfast, lunch, dinner = (
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ('breakfast', 'lunch', 'dinner'))
+        cls.expected = set()
+        for i, tags in enumerate((
+                (breakfast, lunch), (breakfast, lunch, dinner),
+                (lunch,), (breakfast,), (dinner,), ())):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=10)
+            recipe.tags.set(tags)
+            if {breakfast, lunch} & set(tags):
+                cls.expected.add(recipe.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_multiple_tags(self):
+        response = self.client.get(
+            self.url, {'tags': ['breakfast', 'lunch'], 'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.expected)
+        self.assertEqual(response.data['count'], len(self.expected))
+
+    def test_multiple_tags_pages(self):
+        ids = []
+        for page in (1, 2):
+            response = self.client.get(self.url, {
+                'tags': ['breakfast', 'lunch'], 'limit': 2, 'page': page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], len(self.expected))
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.expected)
+
+
+class RecipeDetailTest(APITestCase):
+    """Запросы к несуществующим рецептам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password',
+            first_name='Имя', last_name='Фамилия')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalid_id(self):
+        for authenticated in (False, True):
+            with self.subTest(authenticated=authenticated):
+                self.client.force_authenticate(
+                    self.user if authenticated else None)
+                for pk in ('abc', '0', '12345'):
+                    response = self.client.get(f'/api/recipes/{pk}/')
+                    self.assertEqual(response.status_code, 404)
+
+
+def make_data_url(width, height, noise=False, wrap=False):
+    """PNG-изображение в виде data URL; шум почти не сжимается."""
+    if noise:
+        image = Image.frombytes(
+            'RGB', (width, height), os.urandom(width * height * 3))
+    else:
+        image = Image.new('RGB', (width, height), 'white')
+    content = BytesIO()
+    image.save(content, 'PNG', compress_level=1)
+    encode = base64.encodebytes if wrap else base64.b64encode
+    return 'data:image/png;base64,' + encode(content.getvalue()).decode()
+
+
+class Base64ImageTest(SimpleTestCase):
+    """Декодирование изображений из data URL."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Около 9,5 МБ после декодирования, почти предел в 10 МБ.
+        cls.large = make_data_url(1780, 1780, noise=True)
+        # Модули Pillow импортируются при первой проверке изображения.
+        Base64ImageField().to_internal_value(make_data_url(1, 1)).close()
+
+    def measure_peak(self, function):
+        tracemalloc.start()
+        try:
+            result = function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, peak
+
+    def test_large_upload_memory(self):
+        size = len(base64.b64decode(self.large.split(',')[1]))
+        self.assertGreater(size, 9 * 1024 * 1024)
+        file, peak = self.measure_peak(
+            lambda: decode_base64_image(self.large))
+        with file:
+            self.assertEqual(file.size, size)
+        # Файл пишется на диск частями: в памяти нет копии изображения.
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_large_upload_field_memory(self):
+        file, peak = self.measure_peak(
+            lambda: Base64ImageField().to_internal_value(self.large))
+        file.close()
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_wrapped_base64(self):
+        data = make_data_url(20, 10)
+        with decode_base64_image(make_data_url(20, 10, wrap=True)) as file:
+            content = file.read()
+        self.assertEqual(
+            content, base64.b64decode(data.split(';base64,')[1]))
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.size, (20, 10))
+
+    def test_invalid_base64(self):
+        for data in ('data:image/png;base64,abc',
+                     'data:image/png;base64,ab!d',
+                     'data:image/png,abcd'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValidationError):
+                    decode_base64_image(data)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_size_limit(self):
+        tracemalloc.start()
+        with self.assertRaises(ValidationError) as error:
+            decode_base64_image(self.large)
+        # Отказ до декодирования: память не выделяется под файл.
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertIn('Размер изображения', str(error.exception))
+        self.assertLess(peak, 64 * 1024)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100 * 100)
+    def test_pixel_limit(self):
+        with decode_base64_image(make_data_url(100, 100)):
+            pass
+        with self.assertRaises(ValidationError) as error:
+            decode_base64_image(make_data_url(101, 100))
+        self.assertIn('пикселей', str(error.exception))
+
+
+class ShoppingListDownloadTest(APITestCase):
+    """Выгрузка списка покупок в разных форматах."""
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password',
+            first_name='Имя', last_name='Фамилия')
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Сахар', 'Мука')]
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=10)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=100)
+                for ingredient in ingredients)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def download(self, **kwargs):
+        response = self.client.get(self.url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        for kwargs in ({}, {'data': {'format': 'csv'}},
+                       {'HTTP_ACCEPT': 'application/json'}):
+            with self.subTest(**kwargs):
+                response, content = self.download(**kwargs)
+                self.assertEqual(
+                    response['Content-Type'], 'text/csv; charset=utf-8')
+                self.assertEqual(
+                    content.decode('utf-8-sig').splitlines(),
+                    ['"Мука, г",200', '"Сахар, г",200'])
+
+    def test_txt(self):
+        response, content = self.download(data={'format': 'txt'})
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            content.decode(), 'Мука (г) - 200\nСахар (г) - 200\n')
+
+    def test_pdf(self):
+        response, content = self.download(data={'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('exported_data.pdf', response['Content-Disposition'])
+        self.assertTrue(content.startswith(b'%PDF-'))
+
+    def test_unknown_format(self):
+        for format in ('json', 'api', 'xml'):
+            with self.subTest(format=format):
+                response = self.client.get(self.url, {'format': format})
+                self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+
+class ShortLinkTest(APITestCase):
+    """Короткие ссылки на рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Имя', last_name='Фамилия')
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', image='recipes/images/recipe.png',
+            text='Описание', cooking_time=10)
+        ShortLink.objects.create(recipe=cls.recipe, shortlink='aB3')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_redirect(self):
+        response = self.client.get(
+            f'/api/recipes/{self.recipe.pk}/get-link/',
+            HTTP_HOST='testserver')
+        self.assertEqual(response.status_code, 200)
+        link = response.data['short-link'].removeprefix('testserver') + '/'
+        for url in (link, link, '/s/aB3/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertRedirects(
+                    response, f'/recipes/{self.recipe.pk}',
+                    fetch_redirect_response=False)
+
+    def test_unknown_link(self):
+        for link in ('zzzzzz', 'aaaaaa', encode_shortlink(10 ** 6),
+                     'zz!zzz', 'zzz', 'zzzzzzz'):
+            with self.subTest(link=link):
+                response = self.client.get(f'/s/{link}/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_deleted_recipe(self):
+        link = f'/s/{encode_shortlink(self.recipe.pk)}/'
+        self.assertEqual(self.client.get(link).status_code, 302)
+        self.recipe.delete()
+        self.assertEqual(self.client.get(link).status_code, 404)
+        response = self.client.get(
+            f'/api/recipes/{self.recipe.pk}/get-link/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeIngredientFilterTest(APITestCase):
+    """Фильтр рецептов по ингредиентам."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Имя', last_name='Фамилия')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3)]
+        cls.recipes = []
+        for i, ingredients in enumerate((
+                cls.ingredients[:2], cls.ingredients[1:], cls.ingredients)):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=10)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=1)
+                for ingredient in ingredients)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_all_and_any(self):
+        first, second, third = (
+            ingredient.id for ingredient in self.ingredients)
+        recipes = [recipe.id for recipe in self.recipes]
+        self.assertEqual(
+            self.get_ids({'ingredients': f'{first},{second}'}),
+            {recipes[0], recipes[2]})
+        self.assertEqual(
+            self.get_ids({'ingredients': f'{first},{first}'}),
+            {recipes[0], recipes[2]})
+        self.assertEqual(
+            self.get_ids({'ingredients': f'{first},{third}',
+                          'ingredients_mode': 'any'}),
+            set(recipes))
+        self.assertEqual(
+            self.get_ids({'exclude_ingredients': str(third)}),
+            {recipes[0]})
+
+    def test_invalid_ids(self):
+        first = self.ingredients[0].id
+        for value in (f'{first}.5', f'{first}.5,{first}', 'a,b'):
+            for param in ('ingredients', 'exclude_ingredients'):
+                with self.subTest(**{param: value}):
+                    response = self.client.get(self.url, {param: value})
+                    self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PERFORMANCE_METRICS=True)
+class QueryRecorderTest(APITestCase):
+    """Запросы к БД учитываются и в замерах, и в профиле запроса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='staff@example.com', username='staff', password='password',
+            first_name='Имя', last_name='Фамилия', is_staff=True)
+        cls.token = Token.objects.create(user=cls.user)
+        Tag.objects.create(name='Тег', slug='tag')
+
+    def test_metrics_and_profile(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.get('/api/tags/', {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        dump = ProfileDump.objects.get(pk=response['X-Profile-Id'])
+        self.assertTrue(dump.sql)
+        # В замеры входят и запросы самого профилировщика.
+        queries = re.search(r'(\d+) queries', response['Server-Timing'])
+        self.assertGreaterEqual(int(queries[1]), len(dump.sql))
@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (CustomUserViewSet, RecipeViewSet,
-                    TagViewSet, IngredientViewSet)
+                    TagViewSet, IngredientViewSet, metrics_view)
 
 
 router = DefaultRouter()
@@ -15,5 +15,6 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 urlpatterns = [
     path(r'auth/', include('djoser.urls')),
     path(r'auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,36 +1,185 @@
-import random
-import string
+import csv
+from io import BytesIO
 
-from recipes.models import ShortLink
-from recipes.constans import LEN_SHORT_LINK
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework import serializers
 
+from recipes.models import DataVersion, Recipe, ShortLink, Tag
+from recipes.constans import (
+    LEN_SHORT_LINK, SHORT_LINK_ALPHABET, SHORT_LINK_MULTIPLIER,
+    SHORT_LINK_OFFSET, TAGS_VERSION)
 
-def check_shortlink(recipe, shortlink):
+
+SHORT_LINK_BASE = len(SHORT_LINK_ALPHABET)
+SHORT_LINK_MODULUS = SHORT_LINK_BASE ** LEN_SHORT_LINK
+SHORT_LINK_INVERSE = pow(SHORT_LINK_MULTIPLIER, -1, SHORT_LINK_MODULUS)
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+TAG_SLUGS_CACHE_TIMEOUT = 60 * 60 * 24
+PDF_FONT = 'ShoppingListFont'
+PDF_FONT_SIZE = 11
+PDF_MARGIN = 20 * mm
+
+
+def encode_shortlink(recipe_id):
+    """
+    Вычисляет короткую ссылку по id рецепта.
+    Id перемешивается обратимым преобразованием, поэтому ссылки
+    не повторяются и не идут подряд, а проверки в БД не нужны.
+    """
+    number = (
+        recipe_id * SHORT_LINK_MULTIPLIER + SHORT_LINK_OFFSET
+    ) % SHORT_LINK_MODULUS
+    chars = []
+    for _ in range(LEN_SHORT_LINK):
+        number, index = divmod(number, SHORT_LINK_BASE)
+        chars.append(SHORT_LINK_ALPHABET[index])
+    return ''.join(chars)
+
+
+def decode_shortlink(shortlink):
+    """Возвращает id рецепта по короткой ссылке или None."""
+    if len(shortlink) != LEN_SHORT_LINK:
+        return None
+    number = 0
+    for char in reversed(shortlink):
+        index = SHORT_LINK_ALPHABET.find(char)
+        if index == -1:
+            return None
+        number = number * SHORT_LINK_BASE + index
     return (
-        ShortLink.objects.filter(shortlink=shortlink).exists()
-        and ShortLink.objects.filter(recipe=recipe).exists())
+        (number - SHORT_LINK_OFFSET) * SHORT_LINK_INVERSE
+    ) % SHORT_LINK_MODULUS
+
+
+def resolve_shortlink(shortlink):
+    """
+    Возвращает id существующего рецепта по короткой ссылке или None.
+    Любая строка из символов алфавита раскодируется в какое-то число,
+    поэтому наличие рецепта проверяется в БД; ссылки старого формата
+    ищутся в БД. Результат кешируется.
+    """
+    key = f'shortlink:{shortlink}'
+    recipe_id = cache.get(key)
+    if recipe_id is not None:
+        return recipe_id
+    recipe_id = decode_shortlink(shortlink)
+    if recipe_id is not None:
+        if not Recipe.objects.filter(id=recipe_id).exists():
+            return None
+    else:
+        recipe_id = ShortLink.objects.filter(
+            shortlink=shortlink).values_list('recipe_id', flat=True).first()
+        if recipe_id is None:
+            return None
+    cache.set(key, recipe_id, SHORT_LINK_CACHE_TIMEOUT)
+    return recipe_id
+
+
+def get_recipe_shortlink(recipe_id):
+    """
+    Возвращает короткую ссылку на существующий рецепт или None.
+    Наличие рецепта кешируется вместе с соответствием ссылка - рецепт.
+    """
+    shortlink = encode_shortlink(recipe_id)
+    if resolve_shortlink(shortlink) is None:
+        return None
+    return shortlink
+
+
+def forget_shortlink(recipe_id):
+    """Удаляет из кеша ссылку на удаленный рецепт."""
+    cache.delete(f'shortlink:{encode_shortlink(recipe_id)}')
 
 
 def create_shortlink(recipe):
-    while True:
-        shortlink = ''.join(
-            random.choice(
-                string.ascii_letters + string.digits) for x in range(
-                    LEN_SHORT_LINK))
-        if not check_shortlink(recipe, shortlink):
-            break
-    obj = ShortLink.objects.create(recipe=recipe, shortlink=shortlink)
-    obj.save
-
-
-def sum_ingredients(ingredients_in_recipes):
-    ingr_dict = {}
-    for ingr in ingredients_in_recipes:
-        if ((ingr.ingredient.name + ', '
-             + ingr.ingredient.measurement_unit) in ingr_dict.keys()):
-            ingr_dict[ingr.ingredient.name + ', '
-                      + ingr.ingredient.measurement_unit] += ingr.amount
-        else:
-            ingr_dict[ingr.ingredient.name + ', '
-                      + ingr.ingredient.measurement_unit] = ingr.amount
-    return ingr_dict
+    ShortLink.objects.create(
+        recipe=recipe, shortlink=encode_shortlink(recipe.id))
+
+
+class Echo:
+    """Псевдо-буфер, возвращающий записанную в него строку."""
+
+    def write(self, value):
+        return value
+
+
+def get_tag_ids(slugs):
+    """
+    Возвращает id тегов по списку slug, неизвестные slug пропускаются.
+    Соответствие slug - id кешируется до изменения тегов.
+    """
+    version, _ = DataVersion.objects.get_versions(TAGS_VERSION)
+    key = f'tag-slugs:{version}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, TAG_SLUGS_CACHE_TIMEOUT)
+    return {tag_ids[slug] for slug in slugs if slug in tag_ids}
+
+
+def shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield '\ufeff'
+    for ingredient in ingredients:
+        yield writer.writerow((
+            f'{ingredient["ingredient__name"]}, '
+            f'{ingredient["ingredient__measurement_unit"]}',
+            ingredient['total_amount']))
+
+
+def shopping_list_txt(ingredients):
+    for ingredient in ingredients:
+        yield (f'{ingredient["ingredient__name"]} '
+               f'({ingredient["ingredient__measurement_unit"]}) - '
+               f'{ingredient["total_amount"]}\n')
+
+
+def shopping_list_pdf(ingredients):
+    """
+    Список покупок в PDF. Документ собирается в памяти целиком,
+    его размер ограничен числом ингредиентов.
+    """
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT))
+    content = BytesIO()
+    width, height = A4
+    canvas = Canvas(content, pagesize=A4)
+    canvas.setTitle('Список покупок')
+    canvas.setFont(PDF_FONT, PDF_FONT_SIZE * 1.5)
+    top = height - PDF_MARGIN
+    canvas.drawString(PDF_MARGIN, top, 'Список покупок')
+    y = top - PDF_FONT_SIZE * 3
+    canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+    for ingredient in ingredients:
+        lines = simpleSplit(
+            f'• {ingredient["ingredient__name"]} '
+            f'({ingredient["ingredient__measurement_unit"]}) - '
+            f'{ingredient["total_amount"]}',
+            PDF_FONT, PDF_FONT_SIZE, width - 2 * PDF_MARGIN)
+        for line in lines:
+            if y < PDF_MARGIN:
+                canvas.showPage()
+                canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+                y = top
+            canvas.drawString(PDF_MARGIN, y, line)
+            y -= PDF_FONT_SIZE * 1.5
+    canvas.save()
+    yield content.getvalue()
+
+
+def get_limit(request, param):
+    limit = request.query_params.get(param)
+    if limit is None:
+        return None
+    if not limit.isdigit():
+        raise serializers.ValidationError(
+            f'Значение {param} должно быть числом.')
+    return int(limit)
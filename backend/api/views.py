@@ -1,17 +1,19 @@
-import csv
-import codecs
-
+from asgiref.sync import sync_to_async
 from django_filters.rest_framework import DjangoFilterBackend
-from django.views.decorators.http import require_http_methods
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import (
+    Exists, F, OuterRef, Prefetch, Subquery, Value)
 from django.shortcuts import redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import (
+    Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse)
 from djoser.conf import settings
 from djoser.views import UserViewSet
-from rest_framework import mixins, viewsets, status, filters
-from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework import mixins, viewsets, status
+from rest_framework.settings import api_settings
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import (
+    AllowAny, IsAdminUser, IsAuthenticated)
 from rest_framework.response import Response
 
 from .serializers import (
@@ -20,17 +22,34 @@ from .serializers import (
     SubscribeCreateSerializer, SetPasswordSerializer,
     SubscribeReturnSerializer, ShoppingCartCreateSerializer,
     FavoriteRecipeCreateSerializer)
+from recipes.constans import (
+    INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION)
+from recipes.search import search_ingredients
 from recipes.models import (
-    Recipe, Ingredient, Tag, ShortLink,
-    IngredientInRecipe)
-from .pagination import CustomPaginator
+    Recipe, Ingredient, Tag, ShoppingListItem, Subscription)
+from .mixins import (
+    ConditionalGetMixin, ResponseCacheMixin, get_response_cache_stats)
+from .authentication import get_token_cache_stats
+from .metrics import render_prometheus
+from .pagination import CustomPaginator, KeysetPaginator
 from .permissions import IsCurrentUserOrAdminOrReadOnly
-from .filters import RecipeFilter
-from .utils import sum_ingredients
+from .filters import RecipeFilter, StableOrderingFilter
+from .images import schedule_renditions_deletion
+from .renderers import (
+    CSVRenderer, PDFRenderer, PlainTextRenderer, ShoppingListNegotiation)
+from .utils import (
+    get_limit, get_recipe_shortlink, resolve_shortlink,
+    shopping_list_csv, shopping_list_pdf, shopping_list_txt)
 
 
 User = get_user_model()
 
+SHOPPING_LIST_FORMATS = {
+    'csv': shopping_list_csv,
+    'txt': shopping_list_txt,
+    'pdf': shopping_list_pdf,
+}
+
 
 class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
@@ -60,7 +79,11 @@ class CustomUserViewSet(UserViewSet):
             return Response(
                 serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.avatar.delete()
+        user = request.user
+        schedule_renditions_deletion(user.avatar_renditions)
+        user.avatar.delete(save=False)
+        user.avatar_renditions = ''
+        user.save(update_fields=('avatar', 'avatar_renditions'))
         return Response(
             'Avatar is deleted', status=status.HTTP_204_NO_CONTENT)
 
@@ -94,8 +117,19 @@ class CustomUserViewSet(UserViewSet):
             permission_classes=[IsAuthenticated],
             pagination_class=CustomPaginator)
     def subscriptions(self, request):
+        recipes = Recipe.objects.all()
+        recipes_limit = get_limit(request, 'recipes_limit')
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]))
         authors_queryset = User.objects.filter(
-            subscribers__in=request.user.sub_authors.all())
+            subscribers__subscriber=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('id').prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview'))
         paginate_user_subscriptions = self.paginate_queryset(authors_queryset)
         serializer = SubscribeReturnSerializer(
             paginate_user_subscriptions,
@@ -104,15 +138,53 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, ResponseCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsCurrentUserOrAdminOrReadOnly]
     pagination_class = CustomPaginator
     http_method_names = [
         'get', 'post', 'patch',
         'delete', 'list', 'retrieve']
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, StableOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count')
+    data_versions = (RECIPES_VERSION,)
+    conditional_actions = ('retrieve',)
+
+    def get_etag(self, version):
+        user = self.request.user
+        if not user.is_authenticated:
+            return version
+        pk = self.kwargs['pk']
+        if not pk.isdigit():
+            # Некорректный id: get_object() вернет 404.
+            return None
+        flags = Recipe.objects.with_user_flags(user).filter(
+            pk=pk
+        ).annotate(is_subscribed=Exists(Subscription.objects.filter(
+            author=OuterRef('author'), subscriber=user))
+        ).values_list(
+            'is_favorited', 'is_in_shopping_cart', 'is_subscribed').first()
+        if flags is None:
+            return None
+        return f'{version}-{user.pk}-' + ''.join(
+            str(int(flag)) for flag in flags)
+
+    def get_cache_control(self):
+        if self.request.user.is_authenticated:
+            return {'private': True, 'no_cache': True}
+        return {'public': True, 'no_cache': True}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'feed'):
+            context['image_renditions'] = {'detail': 'thumbnail'}
+        return context
+
+    def get_queryset(self):
+        user = self.request.user
+        return Recipe.objects.with_related(user).with_user_flags(user)
 
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
@@ -124,6 +196,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(user=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['get', ],
+            permission_classes=(IsAuthenticated, ),
+            pagination_class=KeysetPaginator)
+    def feed(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__subscribers__subscriber=request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk=None):
@@ -148,62 +230,95 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_shopping_cart_favorite(request, serializer)
 
         obj = recipe.shoppingcart_set.all().filter(user=request.user)
-        obj.delete()
+        with transaction.atomic():
+            obj.delete()
         return Response({'status': 'Рецепт удален из списка покупок.'},
                         status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get', ],
-            permission_classes=(IsAuthenticated, ))
+            permission_classes=(IsAuthenticated, ),
+            renderer_classes=(CSVRenderer, PlainTextRenderer, PDFRenderer),
+            content_negotiation_class=ShoppingListNegotiation)
     def download_shopping_cart(self, request):
-        ingredients_in_recipes = IngredientInRecipe.objects.select_related(
-            'ingredient').filter(recipe__shoppingcart__user=request.user)
-        ingredients_dict = sum_ingredients(ingredients_in_recipes)
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="exported_data.csv"')
-        response.write(codecs.BOM_UTF8)
-        writer = csv.writer(response)
-        for ingredient in ingredients_dict.items():
-            writer.writerow(ingredient)
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            total_amount=F('amount')
+        ).order_by('ingredient__name')
+
+        renderer = request.accepted_renderer
+        content = SHOPPING_LIST_FORMATS[renderer.format]
+        content_type = renderer.media_type
+        if renderer.format != 'pdf':
+            content_type += '; charset=utf-8'
+        # Строки читаются из БД в представлении: в режиме ASGI тело
+        # ответа формируется в цикле событий, где запросы к БД запрещены.
+        # Список покупок ограничен числом ингредиентов.
+        response = StreamingHttpResponse(
+            content(list(ingredients)), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment;filename="exported_data.{renderer.format}"')
         return response
 
+    @action(detail=False, methods=['get', ],
+            permission_classes=(IsAdminUser, ), url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response({
+            **get_response_cache_stats(),
+            'token_auth': get_token_cache_stats(),
+        })
+
     @action(detail=True, methods=['get', ],
             permission_classes=(AllowAny,), url_path='get-link')
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
-        try:
-            shortlink = ShortLink.objects.get(recipe=recipe)
-            return Response({'short-link': request.META['HTTP_HOST']
-                             + '/s/' + f'{shortlink.shortlink}'},)
-        except ObjectDoesNotExist:
-            return Response({'status': 'Такой короткой ссылки не существует.'})
+        shortlink = get_recipe_shortlink(int(pk)) if pk.isdigit() else None
+        if shortlink is None:
+            raise Http404('Рецепт не найден.')
+        return Response({'short-link': request.META['HTTP_HOST']
+                         + '/s/' + shortlink},)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     pagination_class = None
     http_method_names = ['get', 'list', 'retrieve']
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
+    data_versions = (TAGS_VERSION,)
 
 
-class IngredientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                        viewsets.GenericViewSet):
+class IngredientViewSet(ConditionalGetMixin, mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     pagination_class = None
     http_method_names = ['get', 'list', 'retrieve']
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny, ]
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name', )
+    data_versions = (INGREDIENTS_VERSION,)
 
+    def filter_queryset(self, queryset):
+        name = self.request.query_params.get(api_settings.SEARCH_PARAM, '')
+        limit = get_limit(self.request, 'limit')
+        if self.action != 'list' or (not name and limit is None):
+            return super().filter_queryset(queryset)
+        return search_ingredients(name.strip(), limit)
 
-@ require_http_methods(["GET", ])
-def shortlinkview(request, link):
-    try:
-        shortlink_obj = ShortLink.objects.get(shortlink=link)
-        return redirect(f'/recipes/{shortlink_obj.recipe.id}')
-    except ObjectDoesNotExist:
-        return Response(
-            {'status': 'Такой короткой ссылки на рецепт не существует'})
+
+@api_view(['GET', ])
+@permission_classes((IsAdminUser, ))
+def metrics_view(request):
+    """Гистограммы эндпоинтов текущего процесса для Prometheus."""
+    return HttpResponse(
+        render_prometheus(), content_type='text/plain; version=0.0.4')
+
+
+async def shortlinkview(request, link):
+    # Асинхронное представление: проверка ссылки по кешу и БД
+    # выполняется в потоке.
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    recipe_id = await sync_to_async(resolve_shortlink)(link)
+    if recipe_id is None:
+        raise Http404('Такой короткой ссылки на рецепт не существует')
+    return redirect(f'/recipes/{recipe_id}')
@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Синхронный код каждого запроса выполняется в своем потоке, поэтому
+# постоянные соединения с БД не переиспользуются: вместо них
+# используется пул соединений (DB_POOL=True).
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Django 3.2 выполняет синхронные представления (в том числе DRF)
+    # в одном общем потоке. Отдельный контекст на запрос позволяет
+    # обрабатывать такие запросы параллельно, пока другие ждут ответа БД.
+    # Сравнение с общим потоком: manage.py benchmark_slow_clients.
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
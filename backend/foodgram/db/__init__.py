@@ -0,0 +1,13 @@
+from django.db import connections
+
+
+def check_connections_health(**kwargs):
+    """
+    Закрывает неработающие постоянные соединения с БД в начале запроса,
+    чтобы запрос не получил ошибку на соединении, разорванном сервером.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
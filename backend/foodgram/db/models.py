@@ -0,0 +1,15 @@
+class ComputedFieldsMixin:
+    """
+    Модель с полями computed_fields, которые обновляются только
+    запросами к БД (счетчики, поисковый вектор и т.п.). При обычном
+    сохранении их устаревшие значения не записываются.
+    """
+    computed_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.computed_fields]
+        super().save(*args, **kwargs)
@@ -0,0 +1,104 @@
+"""
+PostgreSQL с пулом соединений внутри процесса.
+Подходит для потоковых воркеров: соединение берется из пула при первом
+обращении к БД и возвращается в пул в конце запроса вместо закрытия.
+"""
+import threading
+from collections import deque
+
+from django.db.backends.postgresql import base
+from django.db.utils import OperationalError
+from psycopg2 import Error, extensions
+
+
+class ConnectionPool:
+    """Пул соединений с ограничением размера и времени ожидания."""
+
+    def __init__(self, max_size, timeout, health_checks):
+        self.timeout = timeout
+        self.health_checks = health_checks
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+        """
+        Занимает место в пуле и возвращает свободное соединение
+        или None, если нужно открыть новое.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                'Нет свободных соединений с БД в пуле.')
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None or self.is_usable(connection):
+                return connection
+            self.discard(connection)
+
+    def is_usable(self, connection):
+        if connection.closed:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Error:
+            return False
+        return True
+
+    def release(self, connection=None):
+        """Возвращает соединение в пул и освобождает место."""
+        try:
+            if connection is not None and not connection.closed:
+                if (connection.get_transaction_status()
+                        != extensions.TRANSACTION_STATUS_IDLE):
+                    connection.rollback()
+                with self._lock:
+                    self._idle.append(connection)
+        except Error:
+            self.discard(connection)
+        finally:
+            self._slots.release()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict, alias):
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[alias] = ConnectionPool(
+                options.get('MAX_SIZE', 10),
+                options.get('TIMEOUT', 5),
+                options.get('HEALTH_CHECKS', True))
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.settings_dict, self.alias)
+        connection = pool.acquire()
+        if connection is None:
+            try:
+                return super().get_new_connection(conn_params)
+            except Exception:
+                pool.release()
+                raise
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            get_pool(self.settings_dict, self.alias).release(self.connection)
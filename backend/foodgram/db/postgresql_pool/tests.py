@@ -0,0 +1,100 @@
+import threading
+import time
+from unittest import mock
+
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+from psycopg2 import InterfaceError, extensions
+
+from .base import ConnectionPool
+
+
+def make_connection(status=extensions.TRANSACTION_STATUS_IDLE):
+    connection = mock.MagicMock(closed=False)
+    connection.get_transaction_status.return_value = status
+    return connection
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Пул соединений с замененными соединениями psycopg2."""
+
+    def test_reuse(self):
+        pool = ConnectionPool(max_size=2, timeout=1, health_checks=True)
+        self.assertIsNone(pool.acquire())
+        connection = make_connection()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with('SELECT 1')
+        connection.close.assert_not_called()
+
+    def test_timeout(self):
+        pool = ConnectionPool(max_size=2, timeout=0.05, health_checks=True)
+        pool.acquire()
+        pool.acquire()
+        start = time.monotonic()
+        with self.assertRaises(OperationalError):
+            pool.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        pool.release(make_connection())
+        self.assertIsNotNone(pool.acquire())
+
+    def test_wait_for_release(self):
+        pool = ConnectionPool(max_size=1, timeout=5, health_checks=False)
+        pool.acquire()
+        connection = make_connection()
+        timer = threading.Timer(0.05, pool.release, (connection,))
+        timer.start()
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, health_checks=True)
+        pool.acquire()
+        pool.release()
+        self.assertIsNone(pool.acquire())
+
+    def test_closed_connection_discarded(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, health_checks=True)
+        connection = make_connection()
+        pool.acquire()
+        pool.release(connection)
+        connection.closed = True
+        self.assertIsNone(pool.acquire())
+        connection.close.assert_called_once()
+
+    def test_health_check(self):
+        pool = ConnectionPool(max_size=2, timeout=0.05, health_checks=True)
+        broken, healthy = make_connection(), make_connection()
+        broken.cursor.side_effect = InterfaceError
+        pool.acquire()
+        pool.acquire()
+        pool.release(healthy)
+        pool.release(broken)
+        self.assertIs(pool.acquire(), healthy)
+        broken.close.assert_called_once()
+
+    def test_no_health_check(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, health_checks=False)
+        connection = make_connection()
+        pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        connection.cursor.assert_not_called()
+
+    def test_release_rolls_back(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, health_checks=False)
+        connection = make_connection(extensions.TRANSACTION_STATUS_INTRANS)
+        pool.acquire()
+        pool.release(connection)
+        connection.rollback.assert_called_once()
+        self.assertIs(pool.acquire(), connection)
+
+    def test_release_error_discards(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, health_checks=False)
+        connection = make_connection(extensions.TRANSACTION_STATUS_INERROR)
+        connection.rollback.side_effect = InterfaceError
+        pool.acquire()
+        pool.release(connection)
+        connection.close.assert_called_once()
+        self.assertIsNone(pool.acquire())
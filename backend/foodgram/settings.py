@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,10 +39,41 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Замеры запросов: заголовок Server-Timing, журнал foodgram.performance
+# и гистограммы по эндпоинтам (api/metrics/ для staff).
+# Повторы одного SQL больше DUPLICATE_QUERY_THRESHOLD раз за запрос
+# записываются в журнал как предупреждение. Строка с замерами каждого
+# запроса пишется в журнал при PERFORMANCE_LOG_LEVEL=INFO.
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', 'True') == 'True'
+DUPLICATE_QUERY_THRESHOLD = int(os.getenv('DUPLICATE_QUERY_THRESHOLD', 5))
+
+# Профилирование запросов: доля профилируемых обычных запросов
+# (0 - только по запросу сотрудника), интервал выборки стека в секундах
+# и число хранимых результатов.
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+PROFILER_MAX_DUMPS = int(os.getenv('PROFILER_MAX_DUMPS', 200))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -61,14 +93,34 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 
+# Повторное использование соединений с БД:
+# DB_CONN_MAX_AGE - время жизни постоянного соединения в секундах
+# (0 - закрывать после каждого запроса);
+# DB_CONN_HEALTH_CHECKS - проверять соединение перед повторным использованием;
+# DB_POOL - пул соединений внутри процесса для потоковых воркеров,
+# размер пула DB_POOL_MAX_SIZE, ожидание свободного соединения
+# DB_POOL_TIMEOUT секунд. С пулом соединения возвращаются в пул
+# в конце запроса, поэтому DB_CONN_MAX_AGE не используется.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'foodgram.db.postgresql_pool' if DB_POOL
+            else 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60))),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        },
     }
 }
 
@@ -83,6 +135,21 @@ DATABASES = {
 }
 """
 
+# По умолчанию используется кеш в памяти процесса. Для общего кеша
+# нескольких процессов укажите, например, CACHE_BACKEND=
+# django_redis.cache.RedisCache и CACHE_LOCATION=redis://redis:6379/1.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Время жизни (в секундах) закешированных ответов для анонимных
+# пользователей.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,6 +182,18 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Количество фоновых потоков для создания уменьшенных копий изображений.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Ограничения на загружаемые изображения: размер в байтах
+# (как client_max_body_size в nginx) и число пикселей.
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 40_000_000))
+
+# Шрифт TrueType с кириллицей для списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -126,7 +205,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend', ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -134,6 +213,29 @@ REST_FRAMEWORK = {
     'SEARCH_PARAM': 'name',
 }
 
+# Время (в секундах), в течение которого клиенты могут не перезапрашивать
+# редко меняющиеся справочники (теги, ингредиенты).
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 300))
+
+# Поиск ингредиентов по префиксному дереву в памяти процесса
+# вместо запросов к БД на каждое нажатие клавиши.
+INGREDIENT_SEARCH_TRIE = os.getenv('INGREDIENT_SEARCH_TRIE', 'False') == 'True'
+INGREDIENT_SEARCH_TRIE_TTL = int(os.getenv('INGREDIENT_SEARCH_TRIE_TTL', 300))
+
+# Пагинация по ключу (курсору) для всех списков вместо постраничной.
+PAGINATION_CURSOR_MODE = os.getenv('PAGINATION_CURSOR_MODE', 'False') == 'True'
+# Время кеширования (в секундах) общего числа объектов в постраничной
+# пагинации, 0 - не кешировать.
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 0))
+
+
+# Кеш аутентификации по токену: локальный LRU-кеш процесса
+# (размер и время жизни в секундах) и необязательный общий кеш.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+TOKEN_SHARED_CACHE = os.getenv('TOKEN_SHARED_CACHE', 'False') == 'True'
+TOKEN_SHARED_CACHE_TTL = int(os.getenv('TOKEN_SHARED_CACHE_TTL', 300))
 
 DJOSER = {
     'LOGIN_FIELD': 'email',
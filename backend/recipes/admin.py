@@ -1,6 +1,12 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 from . import models
+from .signals import batch_recipe_changes
 
 
 class IngredientInRecipe(admin.TabularInline):
@@ -39,7 +45,12 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='В избранном')
     def in_favorited(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
+
+    def changeform_view(self, *args, **kwargs):
+        # Рецепт и ингредиенты из формы дают одно событие изменения.
+        with batch_recipe_changes():
+            return super().changeform_view(*args, **kwargs)
 
 
 @admin.register(models.FavoriteRecipe)
@@ -64,3 +75,51 @@ class SubscriptionAdmin(admin.ModelAdmin):
 class ShortLinkAdmin(admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'shortlink')
     list_editable = ('recipe', 'shortlink')
+
+
+@admin.register(models.ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    list_filter = ('user', )
+
+
+@admin.register(models.ProfileDump)
+class ProfileDumpAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'created_at', 'method', 'path', 'user', 'reason',
+                    'status_code', 'duration', 'samples')
+    list_filter = ('reason', 'method', 'status_code')
+    search_fields = ('path', )
+    readonly_fields = ('created_at', 'method', 'path', 'user', 'reason',
+                       'status_code', 'duration', 'samples', 'stacks_file',
+                       'stacks', 'sql')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Файл стеков')
+    def stacks_file(self, obj):
+        return format_html('<a href="{}">{}</a>', reverse(
+            'admin:recipes_profiledump_stacks', args=(obj.pk, )),
+            f'profile-{obj.pk}.folded')
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/stacks/',
+                 self.admin_site.admin_view(self.stacks_view),
+                 name='recipes_profiledump_stacks'),
+            *super().get_urls(),
+        ]
+
+    def stacks_view(self, request, pk):
+        # Файл для flamegraph.pl или speedscope.
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        dump = get_object_or_404(models.ProfileDump, pk=pk)
+        response = HttpResponse(
+            dump.stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment;filename="profile-{pk}.folded"')
+        return response
@@ -11,4 +11,30 @@ RECIPE_NAME_MAX_LENGTH = 256
 
 SHORTLINK_MAX_LENTH = 50
 
-LEN_SHORT_LINK = 3
+LEN_SHORT_LINK = 6
+SHORT_LINK_ALPHABET = (
+    'ahcJ3Gj0eXHosdA8P5uWbigrS7vUE4TBKwOtIZN9yQnFxMmpq12CVYDzk6RlLf')
+SHORT_LINK_MULTIPLIER = 962813367
+SHORT_LINK_OFFSET = 2185
+
+DATA_VERSION_NAME_MAX_LENGTH = 32
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+RECIPES_VERSION = 'recipes'
+
+IMAGE_RENDITIONS = {
+    'thumbnail': (480, 480),
+    'detail': (1200, 1200),
+    'avatar': (256, 256),
+}
+
+SEARCH_CONFIG = 'russian'
+
+PROFILE_METHOD_MAX_LENGTH = 8
+PROFILE_REASON_MAX_LENGTH = 8
+PROFILE_REASON_STAFF = 'staff'
+PROFILE_REASON_SAMPLE = 'sample'
+PROFILE_REASONS = (
+    (PROFILE_REASON_STAFF, 'Запрос сотрудника'),
+    (PROFILE_REASON_SAMPLE, 'Выборка'),
+)
@@ -0,0 +1,111 @@
+import csv
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+
+
+User = get_user_model()
+
+CATALOGUE_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+DISHES = (
+    'суп', 'салат', 'пирог', 'каша', 'запеканка', 'котлеты', 'соус',
+    'рагу', 'омлет', 'блины', 'плов', 'торт')
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'перемешать', 'варить', 'минут',
+    'духовке', 'сковороде', 'мелко', 'кусочками', 'посолить', 'подавать',
+    'горячим', 'остудить', 'взбить', 'тесто', 'начинка', 'огне')
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Отмена транзакции с тестовыми данными."""
+
+
+@contextmanager
+def rollback():
+    """Выполняет блок в транзакции и откатывает ее."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def measure(function, repeat):
+    """Время выполнения function за repeat повторов, в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings, percent):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, len(timings) * percent // 100)]
+
+
+def summary(timings):
+    """Медиана, 95-й процентиль и максимум замеров."""
+    return (f'{statistics.median(timings):.2f}; '
+            f'{percentile(timings, 95):.2f}; {max(timings):.2f}')
+
+
+def read_catalogue(path=CATALOGUE_PATH):
+    """Пары (название, единица измерения) из CSV-каталога ингредиентов."""
+    with open(path, encoding='utf-8') as file:
+        return [tuple(row) for row in csv.reader(file) if row]
+
+
+def ensure_catalogue(rows):
+    """Заполняет пустой справочник ингредиентов строками каталога."""
+    if not Ingredient.objects.exists():
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in rows),
+            batch_size=1000)
+
+
+def create_recipes(count, ingredients_per_recipe):
+    """
+    Создает count синтетических рецептов с ингредиентами из каталога,
+    названиями и описаниями из типовых слов. Возвращает автора.
+    """
+    ensure_catalogue(read_catalogue())
+    author = User.objects.create(
+        email='benchmark@example.com', username='benchmark',
+        first_name='benchmark', last_name='benchmark')
+    ingredients = list(Ingredient.objects.values_list('id', 'name'))
+    for batch_start in range(0, count, BATCH_SIZE):
+        recipes = []
+        for _ in range(min(BATCH_SIZE, count - batch_start)):
+            chosen = random.sample(ingredients, ingredients_per_recipe)
+            recipes.append((Recipe(
+                author=author,
+                name=f'{random.choice(DISHES)} {chosen[0][1]}',
+                image='recipes/images/benchmark.png',
+                text=' '.join(
+                    random.choice(WORDS + (chosen[-1][1],))
+                    for _ in range(30)),
+                cooking_time=random.randint(5, 180)), chosen))
+        Recipe.objects.bulk_create(recipe for recipe, _ in recipes)
+        # bulk_create заполняет id не во всех СУБД.
+        ids = Recipe.objects.filter(author=author).order_by(
+            '-id').values_list('id', flat=True)[:len(recipes)]
+        IngredientInRecipe.objects.bulk_create(
+            (IngredientInRecipe(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=random.randint(1, 500))
+             for recipe_id, (_, chosen) in zip(sorted(ids), recipes)
+             for ingredient_id, _ in chosen),
+            batch_size=BATCH_SIZE)
+    return author
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.utils import encode_shortlink
+from recipes.management.benchmark import summary
+from recipes.management.load import run_load, run_server
+from recipes.models import Recipe
+
+
+MODES = (
+    ('соединение на запрос', {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'}),
+    ('постоянные соединения',
+     {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'}),
+    ('пул соединений', {'DB_POOL': 'True'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число запросов в секунду к списку тегов и коротким '
+        'ссылкам на gunicorn с потоковыми воркерами: без постоянных '
+        'соединений с БД, с постоянными соединениями и с пулом. '
+        'Используется текущая БД, данные не изменяются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--port', type=int, default=8765,
+            help='Порт, на котором запускается сервер.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Число процессов gunicorn.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Число потоков в процессе gunicorn.')
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Число одновременных клиентов.')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера в секундах.')
+
+    def handle(self, *args, **options):
+        paths = ['/api/tags/']
+        recipe_id = Recipe.objects.order_by('id').values_list(
+            'id', flat=True).first()
+        if recipe_id is None:
+            self.stderr.write('Рецептов нет, короткие ссылки не замеряются.')
+        else:
+            paths.append(f'/s/{encode_shortlink(recipe_id)}/')
+        modes = MODES
+        if connection.vendor != 'postgresql':
+            self.stderr.write(
+                'Пул соединений есть только для PostgreSQL, '
+                'режим с пулом пропускается.')
+            modes = MODES[:-1]
+        self.stdout.write(
+            'режим; путь; запросов/с; ошибок; медиана, мс; p95, мс; max, мс')
+        for mode, env in modes:
+            with run_server(
+                    'foodgram.wsgi', options['port'],
+                    env=env,
+                    workers=options['workers'], threads=options['threads']):
+                for path in paths:
+                    # Прогрев: открытие соединений и импорт модулей.
+                    run_load(options['port'], path, options['concurrency'], 1)
+                    rate, timings, errors = run_load(
+                        options['port'], path, options['concurrency'],
+                        options['duration'])
+                    self.stdout.write(
+                        f'{mode}; {path}; {rate:.0f}; {errors}; '
+                        f'{summary(timings) if timings else "-; -; -"}')
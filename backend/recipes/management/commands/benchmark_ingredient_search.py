@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.management.benchmark import (
+    CATALOGUE_PATH, ensure_catalogue, measure, read_catalogue, rollback,
+    summary)
+from recipes.models import Ingredient
+from recipes.search import (
+    INGREDIENT_FIELDS, IngredientTrie, search_ingredients_in_db)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку автодополнения ингредиентов на каждое нажатие '
+        'клавиши: прежний запрос без ограничения, поиск в БД и поиск '
+        'по префиксному дереву. Набираются названия из data/ingredients.csv; '
+        'пустой каталог заполняется из этого файла в транзакции, которая '
+        'затем откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=CATALOGUE_PATH)
+        parser.add_argument(
+            '--words', type=int, default=50,
+            help='Число набираемых названий.')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Число подсказок (параметр limit).')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Число повторов каждого запроса.')
+
+    def handle(self, *args, **options):
+        rows = read_catalogue(options['path'])
+        random.seed(0)
+        # Набор каждого названия по буквам: "с", "са", "сах", ...
+        words = random.sample(rows, min(options['words'], len(rows)))
+        keystrokes = [
+            name[:length]
+            for name, _ in words
+            for length in range(1, len(name) + 1)]
+        limit = options['limit']
+        with rollback():
+            ensure_catalogue(rows)
+            start = time.perf_counter()
+            trie = IngredientTrie(
+                Ingredient.objects.order_by('name').values(
+                    *INGREDIENT_FIELDS))
+            build_time = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f'Ингредиентов: {len(trie.ingredients)}, '
+                f'нажатий: {len(keystrokes)}, '
+                f'построение дерева: {build_time:.1f} мс')
+            ways = (
+                ('istartswith без limit', lambda name: list(
+                    Ingredient.objects.filter(name__istartswith=name))),
+                ('БД', lambda name: search_ingredients_in_db(name, limit)),
+                ('дерево', lambda name: trie.search(name, limit)),
+            )
+            self.stdout.write('способ; медиана, мс; p95, мс; max, мс')
+            for way, search in ways:
+                timings = []
+                for name in keystrokes:
+                    timings.extend(measure(
+                        lambda: search(name), options['repeat']))
+                self.stdout.write(f'{way}; {summary(timings)}')
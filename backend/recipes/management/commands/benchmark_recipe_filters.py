@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from recipes.management.benchmark import (
+    create_recipes, measure, percentile, rollback, summary)
+from recipes.models import IngredientInRecipe, Recipe
+
+
+INGREDIENTS_PER_RECIPE = 5
+TARGET_MS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет фильтры рецептов по ингредиентам и времени '
+        'приготовления на синтетических данных (по умолчанию миллион '
+        'строк ингредиентов в рецептах). Данные создаются в транзакции '
+        'и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1_000_000,
+            help='Число строк ингредиентов в рецептах.')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Размер страницы результатов.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Число повторов каждого запроса.')
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        limit = options['limit']
+        with rollback():
+            start = time.perf_counter()
+            author = create_recipes(
+                options['rows'] // INGREDIENTS_PER_RECIPE,
+                INGREDIENTS_PER_RECIPE)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE recipes_recipe')
+                    cursor.execute('ANALYZE recipes_ingredientinrecipe')
+            self.stdout.write(
+                f'Строк ингредиентов: {IngredientInRecipe.objects.count()}, '
+                f'создание данных: {time.perf_counter() - start:.1f} с')
+            # Ингредиенты одного рецепта, чтобы у фильтра "все
+            # ингредиенты" были совпадения.
+            sample = random.choice(
+                Recipe.objects.filter(author=author).values_list(
+                    'id', flat=True)[:1000])
+            ids = [str(ingredient_id) for ingredient_id in (
+                IngredientInRecipe.objects.filter(
+                    recipe_id=sample).values_list('ingredient_id', flat=True))]
+            self.stdout.write(
+                f'фильтр; найдено; медиана, мс; p95, мс; max, мс; '
+                f'p95 < {TARGET_MS} мс')
+            for params in (
+                    f'ingredients={ids[0]}',
+                    f'ingredients={",".join(ids[:2])}',
+                    f'ingredients={",".join(ids[:3])}',
+                    f'ingredients={",".join(ids[:3])}&ingredients_mode=any',
+                    f'exclude_ingredients={",".join(ids[:2])}',
+                    'cooking_time__lte=30',
+                    f'ingredients={ids[0]}&cooking_time__lte=60'):
+                queryset = RecipeFilter(
+                    QueryDict(params), queryset=Recipe.objects.all()).qs
+                timings = measure(
+                    lambda: (queryset.count(),
+                             list(queryset.values('id')[:limit])),
+                    options['repeat'])
+                fast = percentile(timings, 95) < TARGET_MS
+                self.stdout.write(
+                    f'{params}; {queryset.count()}; {summary(timings)}; '
+                    f'{"да" if fast else "нет"}')
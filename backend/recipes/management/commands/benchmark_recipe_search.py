@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from recipes.management.benchmark import (
+    create_recipes, measure, rollback, summary)
+from recipes.models import Recipe
+
+
+DEFAULT_QUERIES = (
+    'суп', 'курица', 'пирог с яблоками', 'сыр творог', 'запеканка -сыр')
+INGREDIENTS_PER_RECIPE = 5
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет ранжированный полнотекстовый поиск рецептов (GIN-индекс '
+        'PostgreSQL) и поиск по вхождению подстроки на синтетических '
+        'рецептах. Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100_000,
+            help='Число синтетических рецептов.')
+        parser.add_argument(
+            '--query', action='append', dest='queries',
+            help='Поисковый запрос, можно указать несколько раз.')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Размер страницы результатов.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Число повторов каждого запроса.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(
+                'GIN-индекс есть только в PostgreSQL, замеряется поиск '
+                'по вхождению подстроки.')
+        random.seed(0)
+        limit = options['limit']
+        with rollback():
+            start = time.perf_counter()
+            self.create_data(options['recipes'])
+            self.stdout.write(
+                f'Рецептов: {options["recipes"]}, создание данных: '
+                f'{time.perf_counter() - start:.1f} с')
+            for query in options['queries'] or DEFAULT_QUERIES:
+                ranked = Recipe.objects.search(query)
+                substring = Recipe.objects.filter(
+                    Q(name__icontains=query) | Q(text__icontains=query))
+                self.stdout.write(
+                    f'\n"{query}": найдено {ranked.count()}, индекс: '
+                    f'{self.uses_index(ranked)}')
+                self.stdout.write('способ; медиана, мс; p95, мс; max, мс')
+                for way, queryset in (
+                        ('ранжированный поиск', ranked),
+                        ('icontains', substring)):
+                    timings = measure(
+                        lambda: list(queryset.values('id')[:limit]),
+                        options['repeat'])
+                    self.stdout.write(f'{way}; {summary(timings)}')
+
+    def uses_index(self, queryset):
+        if connection.vendor != 'postgresql':
+            return 'нет'
+        plan = queryset.values('id')[:10].explain()
+        return 'да' if 'search_vector_gin' in plan else 'нет'
+
+    def create_data(self, count):
+        author = create_recipes(count, INGREDIENTS_PER_RECIPE)
+        Recipe.objects.filter(author=author).update_search_vector()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE recipes_recipe')
@@ -0,0 +1,141 @@
+import csv
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+from django.http import HttpResponse
+
+from api.utils import shopping_list_csv, shopping_list_pdf, shopping_list_txt
+from recipes.management.benchmark import measure, rollback, summary
+from recipes.models import (
+    Ingredient, IngredientInRecipe, Recipe, ShoppingCart, ShoppingListItem)
+
+
+User = get_user_model()
+
+INGREDIENTS_PER_RECIPE = 8
+
+
+def sum_ingredients(ingredients_in_recipes):
+    # Прежний способ: суммирование строк рецептов в Python.
+    ingr_dict = {}
+    for ingr in ingredients_in_recipes:
+        if ((ingr.ingredient.name + ', '
+             + ingr.ingredient.measurement_unit) in ingr_dict.keys()):
+            ingr_dict[ingr.ingredient.name + ', '
+                      + ingr.ingredient.measurement_unit] += ingr.amount
+        else:
+            ingr_dict[ingr.ingredient.name + ', '
+                      + ingr.ingredient.measurement_unit] = ingr.amount
+    return ingr_dict
+
+
+def download_python(user):
+    ingredients_dict = sum_ingredients(
+        IngredientInRecipe.objects.select_related('ingredient').filter(
+            recipe__shoppingcart__user=user))
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    for ingredient in ingredients_dict.items():
+        writer.writerow(ingredient)
+    return response.content
+
+
+def download_aggregated(user, content):
+    ingredients = IngredientInRecipe.objects.filter(
+        recipe__shoppingcart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name')
+    return b''.join(
+        part if isinstance(part, bytes) else part.encode()
+        for part in content(list(ingredients)))
+
+
+def download_materialized(user, content):
+    ingredients = ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        total_amount=F('amount')
+    ).order_by('ingredient__name')
+    return b''.join(
+        part if isinstance(part, bytes) else part.encode()
+        for part in content(list(ingredients)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выгрузки списка покупок прежним способом '
+        '(суммирование в Python) и текущим на тестовых данных. '
+        'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Число рецептов в списке покупок.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Число повторов каждого замера.')
+
+    def handle(self, *args, **options):
+        ways = (
+            ('python, csv', download_python),
+            ('sum в БД, csv',
+             lambda user: download_aggregated(user, shopping_list_csv)),
+            ('список, csv',
+             lambda user: download_materialized(user, shopping_list_csv)),
+            ('список, txt',
+             lambda user: download_materialized(user, shopping_list_txt)),
+            ('список, pdf',
+             lambda user: download_materialized(user, shopping_list_pdf)),
+        )
+        self.stdout.write('рецептов; способ; медиана, мс; p95, мс; max, мс')
+        for count in options['recipes']:
+            with rollback():
+                user = self.create_data(count)
+                for name, download in ways:
+                    timings = measure(
+                        lambda: download(user), options['repeat'])
+                    self.stdout.write(f'{count}; {name}; {summary(timings)}')
+
+    def create_data(self, count):
+        user = User.objects.create(
+            email='benchmark@example.com', username='benchmark',
+            first_name='benchmark', last_name='benchmark')
+        if Ingredient.objects.count() < INGREDIENTS_PER_RECIPE * 10:
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'benchmark {i}', measurement_unit='г')
+                for i in range(INGREDIENTS_PER_RECIPE * 10))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        # bulk_create заполняет id не во всех СУБД.
+        Recipe.objects.bulk_create(
+            (Recipe(author=user, name=f'benchmark {i}',
+                    image='recipes/images/benchmark.png', text='benchmark',
+                    cooking_time=10)
+             for i in range(count)),
+            batch_size=1000)
+        recipes = list(Recipe.objects.filter(author=user))
+        IngredientInRecipe.objects.bulk_create(
+            (IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id,
+                amount=random.randint(1, 500))
+             for recipe in recipes
+             for ingredient_id in random.sample(
+                 ingredients, INGREDIENTS_PER_RECIPE)),
+            batch_size=1000)
+        ShoppingCart.objects.bulk_create(
+            (ShoppingCart(user=user, recipe=recipe) for recipe in recipes),
+            batch_size=1000)
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user=user, ingredient_id=total['ingredient'],
+                amount=total['amount'])
+            for total in IngredientInRecipe.objects.filter(
+                recipe__shoppingcart__user=user
+            ).values('ingredient').annotate(
+                amount=Sum('amount')).order_by())
+        return user
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.management.benchmark import summary
+from recipes.management.load import run_load, run_server, slow_clients
+
+
+UVICORN_WORKER = 'uvicorn.workers.UvicornWorker'
+# Без отдельного контекста на запрос (django_application) синхронные
+# представления выполняются в одном общем потоке процесса.
+MODES = (
+    ('wsgi, синхронные воркеры', 'foodgram.wsgi', None),
+    ('asgi, контекст на запрос', 'foodgram.asgi:application',
+     UVICORN_WORKER),
+    ('asgi, общий поток', 'foodgram.asgi:django_application',
+     UVICORN_WORKER),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность и время ответа списка рецептов '
+        'на gunicorn с синхронными воркерами и с воркерами uvicorn, '
+        'пока медленные клиенты держат открытые соединения. '
+        'Используется текущая БД, данные не изменяются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--port', type=int, default=8765,
+            help='Порт, на котором запускается сервер.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Число процессов gunicorn.')
+        parser.add_argument(
+            '--slow-clients', type=int, default=50,
+            help='Число медленных клиентов.')
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Пауза медленного клиента между байтами запроса, с.')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Число одновременных обычных клиентов.')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера в секундах.')
+        parser.add_argument(
+            '--path', default='/api/recipes/',
+            help='Путь, к которому обращаются клиенты.')
+
+    def handle(self, *args, **options):
+        # В режиме asgi соединения с БД берутся из пула (см. README).
+        env = {'DB_POOL': str(connection.vendor == 'postgresql')}
+        port, path = options['port'], options['path']
+        self.stdout.write(
+            'режим; медленных клиентов; запросов/с; ошибок; '
+            'медиана, мс; p95, мс; max, мс')
+        for mode, application, worker_class in MODES:
+            with run_server(
+                    application, port, env=env, worker_class=worker_class,
+                    workers=options['workers']):
+                # Прогрев: открытие соединений и импорт модулей.
+                run_load(port, path, options['concurrency'], 1)
+                for count in (0, options['slow_clients']):
+                    with slow_clients(port, path, count, options['interval']):
+                        rate, timings, errors = run_load(
+                            port, path, options['concurrency'],
+                            options['duration'])
+                    self.stdout.write(
+                        f'{mode}; {count}; {rate:.0f}; {errors}; '
+                        f'{summary(timings) if timings else "-; -; -"}')
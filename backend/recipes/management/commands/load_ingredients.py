@@ -0,0 +1,105 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.constans import INGREDIENTS_VERSION, RECIPES_VERSION
+from recipes.models import DataVersion, Ingredient
+from recipes.search import invalidate_ingredient_trie
+
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Объект обрезан границей блока, дочитываем файл.
+                break
+            yield item['name'], item['measurement_unit']
+    raise CommandError('Некорректный JSON-файл ингредиентов.')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV- или JSON-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH, type=Path,
+            help='Путь к файлу ingredients.csv или ingredients.json.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                'Поддерживаются только файлы .csv и .json.')
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+
+        count_before = Ingredient.objects.count()
+        rows = 0
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            ingredients = reader(file)
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in islice(
+                        ingredients, options['batch_size'])]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                rows += len(batch)
+        elapsed = time.perf_counter() - started
+        invalidate_ingredient_trie()
+        DataVersion.objects.bump(INGREDIENTS_VERSION, RECIPES_VERSION)
+
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {rows}, добавлено ингредиентов: {created} '
+            f'за {elapsed:.2f} с ({rows / elapsed if elapsed else rows:.0f} '
+            'строк/с).'))
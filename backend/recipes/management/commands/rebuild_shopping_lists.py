@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientInRecipe, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает суммы ингредиентов в списках покупок '
+        'по текущему содержимому корзин.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить сохраненные суммы, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        totals = {
+            (total['recipe__shoppingcart__user'], total['ingredient']):
+                total['total_amount']
+            for total in IngredientInRecipe.objects.filter(
+                recipe__shoppingcart__isnull=False
+            ).values(
+                'recipe__shoppingcart__user', 'ingredient'
+            ).annotate(total_amount=Sum('amount')).order_by().iterator()}
+
+        if options['check']:
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount').iterator()}
+            mismatches = {
+                key for key in totals.keys() | stored.keys()
+                if totals.get(key) != stored.get(key)}
+            for user_id, ingredient_id in sorted(mismatches):
+                self.stderr.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'сохранено {stored.get((user_id, ingredient_id))}, '
+                    f'ожидается {totals.get((user_id, ingredient_id))}')
+            if mismatches:
+                raise CommandError(
+                    f'Найдено расхождений: {len(mismatches)}.')
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок совпадают с содержимым корзин.'))
+            return
+
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount)
+                 for (user_id, ingredient_id), amount in totals.items()),
+                batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, записей: {len(totals)}.'))
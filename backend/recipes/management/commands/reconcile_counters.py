@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart, Subscription
+
+
+User = get_user_model()
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')).values('count')), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, списков покупок, '
+        'рецептов и подписчиков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить счетчики, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_related(related_model, related_field)
+            if options['check']:
+                wrong = model.objects.annotate(actual=actual).filter(
+                    ~Q(**{field: F('actual')})).count()
+                if wrong:
+                    self.stderr.write(
+                        f'{model._meta.verbose_name_plural}, {field}: '
+                        f'расхождений {wrong}.')
+                mismatches += wrong
+            else:
+                updated = model.objects.annotate(actual=actual).filter(
+                    ~Q(**{field: F('actual')})).update(**{field: actual})
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}, {field}: '
+                    f'исправлено {updated}.')
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS('Счетчики совпадают.'))
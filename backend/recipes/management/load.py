@@ -0,0 +1,125 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+HOST = '127.0.0.1'
+# Без кеша каждый запрос обращается к БД.
+SERVER_ENV = {
+    'CACHE_BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    'PERFORMANCE_METRICS': 'False',
+}
+
+
+@contextmanager
+def run_server(application, port, env=None, worker_class=None, workers=2,
+               threads=1):
+    """
+    Запускает gunicorn с приложением application на время блока
+    и ждет, пока он начнет принимать соединения.
+    """
+    command = [
+        sys.executable, '-m', 'gunicorn', application,
+        '--bind', f'{HOST}:{port}', '--workers', str(workers),
+        '--threads', str(threads), '--log-level', 'warning']
+    if worker_class:
+        command += ['--worker-class', worker_class]
+    process = subprocess.Popen(
+        command, cwd=settings.BASE_DIR,
+        env={**os.environ, **SERVER_ENV, **(env or {})})
+    try:
+        wait_for_port(port, process)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Сервер завершился при запуске.')
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Сервер не начал принимать соединения.')
+
+
+def run_load(port, path, concurrency, duration):
+    """
+    Отправляет запросы GET path из concurrency потоков в течение
+    duration секунд. Возвращает число запросов в секунду, время ответов
+    в миллисекундах и число ошибок.
+    """
+    timings = []
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(HOST, port, timeout=10)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors.append(1)
+                connection.close()
+                continue
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status >= 500:
+                errors.append(1)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(timings) / (time.monotonic() - start), timings, len(errors)
+
+
+@contextmanager
+def slow_clients(port, path, count, interval):
+    """
+    Держит count соединений, каждое из которых передает запрос
+    по одному байту раз в interval секунд, на время блока.
+    """
+    stop = threading.Event()
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n'
+        'X-Slow-Client: ' + 'x' * 1000 + '\r\n\r\n').encode()
+
+    def client():
+        while not stop.is_set():
+            try:
+                with socket.create_connection((HOST, port)) as connection:
+                    for byte in request:
+                        if stop.wait(interval):
+                            return
+                        connection.sendall(bytes((byte,)))
+                    connection.recv(65536)
+            except OSError:
+                stop.wait(interval)
+
+    threads = [threading.Thread(target=client) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
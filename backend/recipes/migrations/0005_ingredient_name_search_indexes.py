@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_like '
+    'ON recipes_ingredient (UPPER(name) text_pattern_ops)',
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_upper_trgm',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_upper_like',
+)
+
+
+def create_indexes(apps, schema_editor):
+    # Индексы под istartswith/icontains по названию ингредиента.
+    # Нужны только PostgreSQL, SQLite для локальной отладки их не требует.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_INDEXES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
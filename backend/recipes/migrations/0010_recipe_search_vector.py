@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:31
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+FILL_SEARCH_VECTOR = '''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector('russian', recipe.name), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientinrecipe AS ingredient_in_recipe
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = ingredient_in_recipe.ingredient_id
+            WHERE ingredient_in_recipe.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', recipe.text), 'C')
+'''
+
+
+def create_search_index(apps, schema_editor):
+    # GIN-индекс и заполнение вектора нужны только PostgreSQL,
+    # для SQLite используется поиск по вхождению подстроки.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(FILL_SEARCH_VECTOR)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+        'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredient_cooking_time_indexes'),
+    ]
+
+    operations = [
+        # Промежуточная таблица создается автоматически, поэтому индекс
+        # для фильтра по тегам (tag_id, recipe_id) добавляется вручную.
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipes_recipe_tags_tag_recipe_idx',
+        ),
+    ]
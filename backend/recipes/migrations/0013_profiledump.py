@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileDump',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('method', models.CharField(max_length=8, verbose_name='Метод')),
+                ('path', models.TextField(verbose_name='Адрес')),
+                ('reason', models.CharField(choices=[('staff', 'Запрос сотрудника'), ('sample', 'Выборка')], max_length=8, verbose_name='Причина')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration', models.FloatField(verbose_name='Время, мс')),
+                ('samples', models.PositiveIntegerField(verbose_name='Число выборок')),
+                ('stacks', models.TextField(blank=True, verbose_name='Стеки')),
+                ('sql', models.JSONField(default=list, verbose_name='Запросы к БД')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
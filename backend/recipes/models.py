@@ -1,17 +1,29 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField)
 from django.core.exceptions import ValidationError
+from django.db.models import Exists, F, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from foodgram.db.models import ComputedFieldsMixin
 from .constans import (
     TAG_NAME_MAX_LENGTH, TAG_SLUG_MAX_LENGTH, INGREDIENT_NAME_MAX_LENGTH,
     INGREDIENT_MEAS_UNIT_MAX_LENGTH, RECIPE_NAME_MAX_LENGTH,
-    SHORTLINK_MAX_LENTH
+    SHORTLINK_MAX_LENTH, DATA_VERSION_NAME_MAX_LENGTH, SEARCH_CONFIG,
+    PROFILE_METHOD_MAX_LENGTH, PROFILE_REASON_MAX_LENGTH, PROFILE_REASONS
 )
 from .validators import validate_amount, validate_cooking_time
 
 
 User = get_user_model()
 
+RECIPE_COMPUTED_FIELDS = (
+    'favorites_count', 'shopping_cart_count', 'search_vector',
+    'image_renditions')
+
 
 class Tag(models.Model):
     """Модель тега."""
@@ -43,8 +55,70 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для выборки рецептов вместе со связанными данными."""
+
+    def with_related(self, user=None):
+        ingredients = Prefetch(
+            'recipes',
+            queryset=IngredientInRecipe.objects.select_related('ingredient'))
+        queryset = self.defer('search_vector').prefetch_related(
+            'tags', ingredients)
+        if user is None or not user.is_authenticated:
+            return queryset.select_related('author')
+        authors = User.objects.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                author=OuterRef('pk'), subscriber=user)))
+        return queryset.prefetch_related(Prefetch('author', queryset=authors))
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False))
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                recipe=OuterRef('pk'), user=user)))
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам
+        с сортировкой по релевантности. Для SQLite, используемой при
+        локальной отладке, выполняется поиск по вхождению подстроки.
+        """
+        if connection.vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=query) | Q(text__icontains=query)
+                | Q(id__in=IngredientInRecipe.objects.filter(
+                    ingredient__name__icontains=query).values('recipe')))
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        return self.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+
+    def update_search_vector(self):
+        if connection.vendor != 'postgresql':
+            return
+        ingredient_names = Subquery(
+            IngredientInRecipe.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                names=StringAgg('ingredient__name', ' ')
+            ).values('names'))
+        self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(ingredient_names, Value('')),
+                weight='B', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)))
+
+
+class Recipe(ComputedFieldsMixin, models.Model):
     """Модель рецепта."""
+    computed_fields = RECIPE_COMPUTED_FIELDS
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='recipes',
@@ -58,16 +132,39 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images',
         verbose_name='Изображение')
+    image_renditions = models.CharField(
+        'Изображение с готовыми копиями', max_length=100, blank=True,
+        editable=False)
     text = models.TextField('Описание')
     cooking_time = models.IntegerField(
         'Время приготовления', validators=[validate_cooking_time])
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True)
+    favorites_count = models.IntegerField(
+        'В избранном', default=0, editable=False)
+    shopping_cart_count = models.IntegerField(
+        'В списках покупок', default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'),
+            models.Index(
+                fields=['cooking_time', '-id'],
+                name='recipe_cooking_time_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -84,6 +181,20 @@ class IngredientInRecipe(models.Model):
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='ingredient_in_recipe_idx'),
+        ]
+
+
+def get_recipe_amounts(recipe):
+    """Возвращает словарь {id ингредиента: количество} для рецепта."""
+    amounts = {}
+    for ingredient_id, amount in IngredientInRecipe.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+    return amounts
 
 
 class RecipeUserBaseModel(models.Model):
@@ -126,6 +237,67 @@ class ShoppingCart(RecipeUserBaseModel):
         ]
 
 
+class ShoppingListManager(models.Manager):
+    """Менеджер, поддерживающий суммы ингредиентов в списках покупок."""
+
+    def change_amounts(self, user_ids, amounts):
+        """
+        Прибавляет к списку покупок каждого из пользователей user_ids
+        количества ингредиентов из словаря {id ингредиента: количество}.
+        Отрицательное количество уменьшает сумму, пустые строки удаляются.
+        """
+        user_ids = list(user_ids)
+        amounts = {
+            ingredient_id: amount for ingredient_id, amount in amounts.items()
+            if amount}
+        if not user_ids or not amounts:
+            return
+        # Недостающие строки создаются без конфликтов с параллельными
+        # запросами, затем суммы меняются атомарно через F().
+        ingredient_ids_by_amount = {}
+        for ingredient_id, amount in amounts.items():
+            ingredient_ids_by_amount.setdefault(amount, []).append(
+                ingredient_id)
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=ingredient_id,
+                            amount=0)
+                 for user_id in user_ids for ingredient_id in amounts],
+                ignore_conflicts=True)
+            for amount, ingredient_ids in ingredient_ids_by_amount.items():
+                self.filter(
+                    user_id__in=user_ids, ingredient_id__in=ingredient_ids
+                ).update(amount=F('amount') + amount)
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель суммарного количества ингредиента в списке покупок.
+    Обновляется при изменении списка покупок и рецептов в нем.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
 class Subscription(models.Model):
     """Модель подписки."""
     author = models.ForeignKey(
@@ -167,3 +339,80 @@ class ShortLink(models.Model):
 
     def __str__(self):
         return f'{self.recipe} - {self.shortlink}'
+
+
+class DataVersionManager(models.Manager):
+    """Менеджер счетчиков версий данных."""
+
+    def bump(self, *names):
+        for name in names:
+            if not self.filter(name=name).update(
+                    version=F('version') + 1, updated_at=timezone.now()):
+                self.get_or_create(name=name)
+
+    def get_versions(self, *names):
+        """
+        Возвращает строку с версиями данных names
+        и время последнего изменения этих данных.
+        """
+        versions = {
+            name: (version, updated_at)
+            for name, version, updated_at in self.filter(
+                name__in=names).values_list('name', 'version', 'updated_at')}
+        return (
+            '-'.join(
+                f'{name}{versions.get(name, (0, None))[0]}'
+                for name in names),
+            max((updated_at for _, updated_at in versions.values()),
+                default=None))
+
+
+class DataVersion(models.Model):
+    """
+    Модель счетчика версии данных.
+    Счетчик увеличивается при каждом изменении данных и используется
+    для проверки актуальности закешированных ответов.
+    """
+    name = models.CharField(
+        'Название', max_length=DATA_VERSION_NAME_MAX_LENGTH, unique=True)
+    version = models.PositiveIntegerField('Версия', default=1)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = DataVersionManager()
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name} - {self.version}'
+
+
+class ProfileDump(models.Model):
+    """
+    Модель результата профилирования запроса.
+    Стеки хранятся в свернутом формате (folded) для построения
+    flamegraph, запросы к БД - списком с временем выполнения.
+    """
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+    method = models.CharField('Метод', max_length=PROFILE_METHOD_MAX_LENGTH)
+    path = models.TextField('Адрес')
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        verbose_name='Пользователь')
+    reason = models.CharField(
+        'Причина', max_length=PROFILE_REASON_MAX_LENGTH,
+        choices=PROFILE_REASONS)
+    status_code = models.PositiveSmallIntegerField('Код ответа')
+    duration = models.FloatField('Время, мс')
+    samples = models.PositiveIntegerField('Число выборок')
+    stacks = models.TextField('Стеки', blank=True)
+    sql = models.JSONField('Запросы к БД', default=list)
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Ingredient
+
+
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class TrieNode:
+    __slots__ = ('children', 'ingredients')
+
+    def __init__(self):
+        self.children = {}
+        self.ingredients = []
+
+
+class IngredientTrie:
+    """Префиксное дерево названий ингредиентов для автодополнения."""
+
+    def __init__(self, ingredients):
+        self.root = TrieNode()
+        self.ingredients = []
+        for ingredient in ingredients:
+            key = ingredient['name'].lower()
+            self.ingredients.append((key, ingredient))
+            node = self.root
+            for char in key:
+                node = node.children.setdefault(char, TrieNode())
+            node.ingredients.append(ingredient)
+        self.ingredients.sort(key=lambda item: item[0])
+
+    def _find_node(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def search(self, name, limit=None):
+        """
+        Возвращает ингредиенты, название которых начинается с name,
+        а после них - ингредиенты, название которых содержит name.
+        """
+        name = name.lower()
+        results = []
+        node = self._find_node(name)
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            for ingredient in node.ingredients:
+                if limit is not None and len(results) >= limit:
+                    return results
+                results.append(ingredient)
+            stack.extend(
+                node.children[char]
+                for char in sorted(node.children, reverse=True))
+        for key, ingredient in self.ingredients:
+            if limit is not None and len(results) >= limit:
+                break
+            if name in key and not key.startswith(name):
+                results.append(ingredient)
+        return results
+
+
+_trie = None
+_trie_built_at = 0
+_trie_lock = threading.Lock()
+
+
+def get_ingredient_trie():
+    global _trie, _trie_built_at
+    with _trie_lock:
+        if (_trie is None or time.monotonic() - _trie_built_at
+                > settings.INGREDIENT_SEARCH_TRIE_TTL):
+            _trie = IngredientTrie(
+                Ingredient.objects.order_by('name').values(
+                    *INGREDIENT_FIELDS))
+            _trie_built_at = time.monotonic()
+        return _trie
+
+
+def invalidate_ingredient_trie():
+    global _trie
+    with _trie_lock:
+        _trie = None
+
+
+def search_ingredients(name, limit=None):
+    """
+    Поиск ингредиентов для автодополнения: сначала совпадения по началу
+    названия, затем по вхождению подстроки.
+    """
+    if settings.INGREDIENT_SEARCH_TRIE:
+        return get_ingredient_trie().search(name, limit)
+    return search_ingredients_in_db(name, limit)
+
+
+def search_ingredients_in_db(name, limit=None):
+    ingredients = Ingredient.objects.order_by('name').values(
+        *INGREDIENT_FIELDS)
+    results = list(ingredients.filter(name__istartswith=name)[:limit])
+    if limit is None or len(results) < limit:
+        substring_matches = ingredients.filter(
+            name__icontains=name).exclude(name__istartswith=name)
+        if limit is not None:
+            substring_matches = substring_matches[:limit - len(results)]
+        results.extend(substring_matches)
+    return results
@@ -0,0 +1,209 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from users.models import is_last_login_update
+from .constans import INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION
+from .models import (
+    DataVersion, FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
+    ShoppingCart, ShoppingListItem, Subscription, Tag, get_recipe_amounts)
+from .search import invalidate_ingredient_trie
+
+
+User = get_user_model()
+
+# Единое событие изменения рецепта (полей, ингредиентов или тегов),
+# аргумент recipe_id - id измененного рецепта.
+recipe_changed = Signal()
+
+_batch = threading.local()
+_deleting = threading.local()
+
+
+@contextmanager
+def batch_recipe_changes():
+    """
+    Откладывает события изменения рецептов до выхода из блока
+    и отправляет по одному событию на каждый измененный рецепт.
+    """
+    if getattr(_batch, 'recipe_ids', None) is not None:
+        yield
+        return
+    _batch.recipe_ids = set()
+    try:
+        yield
+        recipe_ids = _batch.recipe_ids
+    finally:
+        _batch.recipe_ids = None
+    for recipe_id in recipe_ids:
+        recipe_changed.send(sender=Recipe, recipe_id=recipe_id)
+
+
+def notify_recipe_changed(recipe_id):
+    recipe_ids = getattr(_batch, 'recipe_ids', None)
+    if recipe_ids is not None:
+        recipe_ids.add(recipe_id)
+    else:
+        recipe_changed.send(sender=Recipe, recipe_id=recipe_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.change_amounts(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id))
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    amounts = get_recipe_amounts(instance.recipe_id)
+    ShoppingListItem.objects.change_amounts(
+        [instance.user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()})
+
+
+def change_recipe_amounts(recipe_id, amounts):
+    """Меняет суммы в списках покупок всех, кто добавил рецепт."""
+    ShoppingListItem.objects.change_amounts(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True),
+        amounts)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # При удалении рецепта суммы вычитаются при удалении его из списков
+    # покупок, удаление строк ингредиентов их повторно не меняет.
+    if not hasattr(_deleting, 'recipe_ids'):
+        _deleting.recipe_ids = set()
+    _deleting.recipe_ids.add(instance.pk)
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_recipe_ingredient(sender, instance, **kwargs):
+    instance._saved_amount = (
+        IngredientInRecipe.objects.filter(pk=instance.pk).values_list(
+            'ingredient_id', 'amount').first()
+        if instance.pk else None)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    amounts = {instance.ingredient_id: instance.amount}
+    saved = instance.__dict__.pop('_saved_amount', None)
+    if saved is not None:
+        ingredient_id, amount = saved
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+    change_recipe_amounts(instance.recipe_id, amounts)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if instance.recipe_id in getattr(_deleting, 'recipe_ids', ()):
+        return
+    change_recipe_amounts(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount})
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_ingredient_trie()
+    DataVersion.objects.bump(INGREDIENTS_VERSION, RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    DataVersion.objects.bump(TAGS_VERSION, RECIPES_VERSION)
+
+
+@receiver(recipe_changed, sender=Recipe)
+def update_recipe_data(sender, recipe_id, **kwargs):
+    DataVersion.objects.bump(RECIPES_VERSION)
+    Recipe.objects.filter(pk=recipe_id).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    notify_recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    notify_recipe_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Теги изменены со стороны тега: затронуто сразу много рецептов.
+        DataVersion.objects.bump(RECIPES_VERSION)
+    else:
+        notify_recipe_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    getattr(_deleting, 'recipe_ids', set()).discard(instance.pk)
+    DataVersion.objects.bump(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    # Данные автора входят в представление рецепта,
+    # но обновление даты последнего входа на него не влияет.
+    if is_last_login_update(update_fields):
+        return
+    DataVersion.objects.bump(RECIPES_VERSION)
+
+
+def change_counter(model, pk, field, created):
+    """
+    Изменяет счетчик: +1 при создании объекта, -1 при удалении
+    (в post_delete аргумент created не передается).
+    """
+    if created is False:
+        return
+    delta = -1 if created is None else 1
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_changed(sender, instance, created=None, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', created)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, created=None, **kwargs):
+    change_counter(
+        Recipe, instance.recipe_id, 'shopping_cart_count', created)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def author_recipes_changed(sender, instance, created=None, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', created)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, created=None, **kwargs):
+    change_counter(User, instance.author_id, 'subscribers_count', created)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).update_search_vector()
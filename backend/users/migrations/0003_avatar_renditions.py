@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:08
+
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def mark_ready_renditions(apps, schema_editor):
+    # Копии, созданные до появления поля, проверяются один раз здесь.
+    model = apps.get_model('users', 'AbstractUser')
+    for pk, name in model.objects.filter(
+            avatar__gt='').values_list('pk', 'avatar').iterator():
+        directory, filename = posixpath.split(name)
+        if all(default_storage.exists(posixpath.join(
+                directory, 'renditions', f'{filename}_{rendition}.webp'))
+               for rendition in ('avatar',)):
+            model.objects.filter(pk=pk).update(avatar_renditions=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abstractuser',
+            name='avatar_renditions',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Аватар с готовыми копиями'),
+        ),
+        migrations.RunPython(
+            mark_ready_renditions, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,27 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from foodgram.db.models import ComputedFieldsMixin
 from .constans import USERNAME_MAX_LENGTH
 
 
-class AbstractUser(AbstractUser):
+COMPUTED_FIELDS = ('recipes_count', 'subscribers_count', 'avatar_renditions')
+
+
+class AbstractUser(ComputedFieldsMixin, AbstractUser):
     """Модель пользователя."""
+    computed_fields = COMPUTED_FIELDS
     email = models.EmailField(unique=True, blank=False)
     avatar = models.ImageField(
         upload_to='users', null=True, default=None)
+    avatar_renditions = models.CharField(
+        'Аватар с готовыми копиями', max_length=100, blank=True,
+        editable=False)
     username = models.CharField(max_length=USERNAME_MAX_LENGTH, unique=True)
+    recipes_count = models.IntegerField(
+        'Количество рецептов', default=0, editable=False)
+    subscribers_count = models.IntegerField(
+        'Количество подписчиков', default=0, editable=False)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'password', 'username']
 
@@ -20,3 +32,8 @@ class AbstractUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+def is_last_login_update(update_fields):
+    """Сохранение пользователя обновляет только дату последнего входа."""
+    return update_fields is not None and set(update_fields) == {'last_login'}